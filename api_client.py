@@ -0,0 +1,95 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import streamlit as st
+
+# Base URL of server.py; when set the Streamlit app sends chat, news, relevance, title and
+# rolling-summary calls there and never loads langchain or needs an OpenAI key itself
+CHAT_API_URL = os.getenv("CHAT_API_URL", "").rstrip("/")
+CHAT_API_TIMEOUT = float(os.getenv("CHAT_API_TIMEOUT", "120"))
+
+
+@st.cache_resource(show_spinner=False)
+def get_session():
+    # One pooled session per process so reruns reuse connections to the API
+    return requests.Session()
+
+
+@st.cache_resource(show_spinner=False)
+def get_title_executor():
+    return ThreadPoolExecutor(max_workers=int(os.getenv("TITLE_WORKERS", "4")), thread_name_prefix="title")
+
+
+def post(path, payload):
+    response = get_session().post(f"{CHAT_API_URL}{path}", json=payload, timeout=CHAT_API_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def profile_fields(user_data):
+    return {"department": user_data.get('department'), "interests": user_data['interests'], "skills": user_data['skills']}
+
+
+def is_relevant_query(query, user_data):
+    return post("/relevance", {"prompt": query, "user_data": profile_fields(user_data)})["relevant"]
+
+
+def conversation_history(conversation):
+    # Same contract as context.conversation_history, but returns messages_to_dict output. Only the
+    # turns the summary has not folded yet are sent; the server counts folded from that offset.
+    state = conversation.get("context") or {"summary": "", "folded": 0}
+    messages = conversation["messages"]
+    folded = min(state["folded"], max(len(messages) - 1, 0))
+    data = post("/context", {"messages": messages[folded:], "context": {"summary": state["summary"], "folded": 0}})
+    conversation["context"] = {"summary": data["context"]["summary"], "folded": folded + data["context"]["folded"]}
+    return data["chat_history"]
+
+
+def start_conversation_title(conv_id, messages, on_title):
+    # The first words stand in until the server's title arrives
+    first_message = messages[0]["content"]
+
+    def run():
+        try:
+            title = post("/title", {"conversation_id": conv_id, "message": first_message})["title"]
+        except (requests.RequestException, KeyError, ValueError):
+            return
+        on_title(title)
+
+    get_title_executor().submit(run)
+    return " ".join(first_message.split()[:5]) or "New Conversation"
+
+
+def stream_chat(prompt, scope=None, chat_history=None):
+    # Same events as pipeline.stream_chat, read from the server's NDJSON stream
+    chat_history = chat_history or []
+    if chat_history and not isinstance(chat_history[0], dict):
+        from langchain_core.messages import messages_to_dict
+        chat_history = messages_to_dict(chat_history)
+
+    with get_session().post(f"{CHAT_API_URL}/chat", json={
+        "prompt": prompt,
+        "scope": scope,
+        "chat_history": chat_history,
+        "stream": True
+    }, stream=True, timeout=CHAT_API_TIMEOUT) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["event"] == "error":
+                raise RuntimeError(event["data"])
+            yield event["event"], event["data"]
+
+
+def get_recent_news(user_data, num_articles=10):
+    return post("/news", {"user_data": profile_fields(user_data), "num_articles": num_articles})["articles"]
+
+
+def get_metrics():
+    response = get_session().get(f"{CHAT_API_URL}/metrics", timeout=CHAT_API_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
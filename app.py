@@ -1,17 +1,15 @@
 import streamlit as st
-from langchain import hub
-from langchain.agents import create_openai_functions_agent
-from langchain_openai.chat_models import ChatOpenAI
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.agents import AgentFinish
-from langgraph.graph import END, Graph
 import os
 import uuid
+from functools import partial
 from dotenv import load_dotenv
-from firebase_auth import login, signup, logout, data_to_firebase
-from datetime import datetime, timedelta
-import pytz
+from firebase_auth import login, signup, logout, data_to_firebase, restore_conversations, open_conversation, get_conversation_messages, rename_conversation
+from api_client import CHAT_API_URL
+from startup import STARTUP_PROFILE, since_process_start, start_warm_up
+from session_store import CHAT_RENDER_WINDOW, get_session_store
+
+# The AI stack (langchain, the chain, Firebase) is imported further down, once a user is
+# logged in; until then it loads on a background thread while the login form is shown
 
 load_dotenv()
 
@@ -109,163 +107,36 @@ st.markdown("""
 # Get API keys from environment variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
+# Comma-separated Firebase uids allowed to see the metrics panel
+ADMIN_UIDS = {uid.strip() for uid in os.getenv("ADMIN_UIDS", "").split(",") if uid.strip()}
 
 
-if not OPENAI_API_KEY or not TAVILY_API_KEY:
-    st.error("Please set OPENAI_API_KEY and TAVILY_API_KEY in your .env file")
+# A thin client only talks to server.py, which holds the keys
+if not CHAT_API_URL and not (OPENAI_API_KEY and TAVILY_API_KEY):
+    st.error("Please set OPENAI_API_KEY and TAVILY_API_KEY (or CHAT_API_URL) in your .env file")
     st.stop()
 
-# Initialize tools and agent
-tools = [TavilySearchResults(max_results=5)]
-prompt = hub.pull("hwchase17/openai-functions-agent")
-llm = ChatOpenAI(model="gpt-3.5-turbo")
-
-agent_runnable = create_openai_functions_agent(llm, tools, prompt)
-
-agent = RunnablePassthrough.assign(
-    agent_outcome=agent_runnable
-)
-
-def execute_tools(data):
-    agent_action = data.pop('agent_outcome')
-    tools_to_use = {t.name: t for t in tools}[agent_action.tool]
-    observation = tools_to_use.invoke(agent_action.tool_input)
-    data['intermediate_steps'].append((agent_action, observation))
-    return data
-
-def should_continue(data):
-    if isinstance(data['agent_outcome'], AgentFinish):
-        return "exit"
-    else:
-        return "continue"
-
-workflow = Graph()
-workflow.add_node("agent", agent)
-workflow.add_node("tools", execute_tools)
-workflow.set_entry_point("agent")
-workflow.add_conditional_edges(
-    "agent",
-    should_continue,
-    {
-        "continue": "tools",
-        "exit": END
-    }
-)
-workflow.add_edge('tools', 'agent')
-
-# Compile the chain
-chain = workflow.compile()
-
-# Function to summarize conversation
-def summarize_conversation(messages):
-    if not messages:
-        return "New Conversation"
-    
-    first_message = messages[0]["content"]
-    summary_prompt = f"Summarize the following message in 5 words or less: {first_message}"
-    
-    summary = llm.predict(summary_prompt)
-    return summary.strip()
-
-def generate_three_line_summary(content):
-    summary_prompt = f"Provide a three-line summary of the following content:\n\n{content}\n\nSummary:"
-    summary = llm.predict(summary_prompt)
-    return summary.strip()
-
-# Function to format search results
-def format_search_results(results):
-    if not results:
-        return "No search results found."
-    
-    formatted_results = "Top 5 Sources:\n\n"
-    for i, result in enumerate(results[:5], 1):
-        title = result.get('title')
-        url = result.get('url', 'No URL available')
-        content = result.get('content', 'No content available')
-        
-        if title:
-            formatted_results += f"{i}. [{title}]({url})\n"
-        else:
-            formatted_results += f"{i}. [Reference {i}]({url})\n"
-        
-        summary = generate_three_line_summary(content)
-        formatted_results += f"   {summary}\n\n"
-    
-    return formatted_results
-
-def generate_overall_summary(results):
-    if not results:
-        return "No information available to summarize."
-    
-    combined_content = " ".join([result.get('content', '') for result in results[:5]])
-    summary_prompt = f"Provide a concise overall summary of the following information:\n\n{combined_content}\n\nSummary:"
-    summary = llm.predict(summary_prompt)
-    return summary
-
-def is_relevant_query(query, user_data):
-    prompt = f"""
-    Given the user's department: {user_data['department']}
-    and interests: {', '.join(user_data['interests'])},
-    is the following query relevant? Query: {query}
-    Respond with 'Yes' or 'No'.
-    """
-    response = llm.predict(prompt)
-    return response.strip().lower() == 'yes'
-
-def get_recent_news(user_data, num_articles=10):
-    interests = ", ".join(user_data['interests'])
-    skills = ", ".join(user_data['skills'])
-
-    current_date = datetime.now(pytz.utc).strftime("%Y-%m-%d")
-    
-    search_query = f"latest news as of {current_date} related to {interests} and {skills}"
-    
-    search_results = TavilySearchResults(
-        max_results=20,
-        include_domains=["bbc.com", "cnn.com", "reuters.com", "apnews.com", "bloomberg.com", "nytimes.com", "wsj.com"],
-        exclude_domains=["wikipedia.org"],
-        time_range="d"  # d for past day
-    ).invoke(search_query)
-    
-    prompt = f"""
-    Based on these search results, identify the 10 most recent and relevant news articles related to the user's interests ({interests}) and skills ({skills}).
-    Today's date is {current_date}. Only include articles from the past week, prioritizing the most recent ones.
-    For each article, provide:
-    1. A concise title (max 15 words)
-    2. A brief summary (2-3 sentences)
-    3. The source URL
-    4. The exact publication date and time (if available, in UTC)
-    5. The source name
-
-    Format the output as a list of dictionaries, each containing 'title', 'summary', 'url', 'date', and 'source' keys.
-    Ensure the 'date' field is in the format 'YYYY-MM-DD HH:MM:SS UTC' if available, or 'YYYY-MM-DD' if only the date is known.
-    If the exact date is not available, use 'Recent' as the date value.
-    
-    Sort the articles by date, with the most recent first.
-
-    Search results:
-    {search_results}
-    """
-    
-    news_articles = eval(llm.predict(prompt))
-    
-    # Additional processing to ensure recency
-    current_time = datetime.now(pytz.utc)
-    filtered_articles = []
-    for article in news_articles:
-        try:
-            if article['date'] != 'Recent':
-                article_date = datetime.strptime(article['date'].split()[0], "%Y-%m-%d")
-                article_date = pytz.utc.localize(article_date)
-                if current_time - article_date <= timedelta(days=7):
-                    filtered_articles.append(article)
-            else:
-                filtered_articles.append(article)
-        except ValueError:
-            # If date parsing fails, include the article anyway
-            filtered_articles.append(article)
-    
-    return filtered_articles[:num_articles]
+# Render the answer as tokens arrive and each source summary as it completes
+def render_streamed_response(prompt, user_data, chat_history=None):
+    answer_placeholder = st.empty()
+    sources_placeholder = st.empty()
+    overall_placeholder = st.empty()
+
+    streamed_answer = ""
+    ai_response = ""
+    for kind, payload in stream_chat(prompt, scope=cache_scope(user_data), chat_history=chat_history):
+        if kind == "token":
+            streamed_answer += payload
+            answer_placeholder.markdown(streamed_answer + "▌")
+        elif kind == "answer":
+            answer_placeholder.markdown(payload)
+        elif kind == "sources":
+            sources_placeholder.markdown(payload)
+        elif kind == "overall":
+            overall_placeholder.markdown(f"Overall Summary:\n{payload}")
+        elif kind == "final":
+            ai_response = payload
+    return ai_response
 
 st.markdown('<p class="big-font">Advance AI Powered Search Engine 🤖</p>', unsafe_allow_html=True)
 
@@ -285,18 +156,51 @@ else:
     with tab1:
         if login():
             st.session_state.user_logged_in = True
+            if not CHAT_API_URL:
+                from relevance import prepare_profile
+                prepare_profile(st.session_state.user_data)
+            st.session_state.conversations = restore_conversations(st.session_state.user_data['uid'])
             st.cache_data.clear()
             st.rerun()
     with tab2:
         if signup():
             st.session_state.user_logged_in = True
+            if not CHAT_API_URL:
+                from relevance import prepare_profile
+                prepare_profile(st.session_state.user_data)
             st.rerun()
 
-
-if st.session_state.user_logged_in:
+# Shared agent, tools and chain are built once per process (see startup.py and resources.py)
+warm_up = start_warm_up(bool(CHAT_API_URL))
+if STARTUP_PROFILE:
+    first_paint_ms = st.session_state.setdefault("first_paint_ms", since_process_start())
+    with st.sidebar.expander("Startup profile"):
+        st.caption(f"Login form ready {first_paint_ms} ms after process start")
+        st.dataframe(warm_up.report(), use_container_width=True)
 
 
-    tab1, tab2 = st.tabs(["💬 Chat", "🔥 Trending Topics"])
+if st.session_state.user_logged_in:
+    if not warm_up.done.is_set():
+        with st.spinner("Loading the assistant..."):
+            warm_up.wait()
+    from response_cache import cache_scope
+
+    # With CHAT_API_URL set the app is a thin client of server.py and never loads langchain
+    if CHAT_API_URL:
+        from api_client import stream_chat, get_recent_news, is_relevant_query, conversation_history, start_conversation_title
+    else:
+        from pipeline import stream_chat
+        from news import get_recent_news
+        from relevance import is_relevant_query
+        from context import conversation_history
+        from titles import start_conversation_title
+
+    is_admin = st.session_state.user_data.get('uid') in ADMIN_UIDS
+    # Older messages are spilled out of session_state and paged back in on demand
+    session_store = get_session_store()
+    session_id = st.session_state.setdefault("session_id", str(uuid.uuid4()))
+    tabs = st.tabs(["💬 Chat", "🔥 Trending Topics"] + (["📊 Metrics"] if is_admin else []))
+    tab1, tab2 = tabs[0], tabs[1]
 
     with tab1:
         # current_user_chat=get_data_to_firebase()
@@ -318,26 +222,38 @@ if st.session_state.user_logged_in:
             new_id = str(uuid.uuid4())
             st.session_state.conversations[new_id] = {
                 "title": "New Conversation",
-                "messages": []
+                "messages": [],
+                "loaded": True
             }
             st.session_state.current_conversation_id = new_id
         #Chat History with Inside Div Overflow
 
     
+        # Titles are computed once when the first message arrives, never on rerun
         for conv_id, conv_data in st.session_state.conversations.items():
-            # Update summary title
-            if conv_data["messages"]:
-                conv_data["title"] = summarize_conversation(conv_data["messages"])
-            
             if st.sidebar.button(conv_data["title"], key=conv_id):
                 st.session_state.current_conversation_id = conv_id
 
 
         if st.session_state.current_conversation_id:
-            conversation = st.session_state.conversations[st.session_state.current_conversation_id]
-            
-
-            for message in conversation["messages"]:
+            conv_id = st.session_state.current_conversation_id
+            conversation = st.session_state.conversations[conv_id]
+            session_store.evict(session_id, st.session_state.conversations, conv_id)
+            open_conversation(st.session_state.user_data['uid'], conv_id, conversation)
+            session_store.restore(session_id, conv_id, conversation, CHAT_RENDER_WINDOW - len(conversation["messages"]))
+
+            # Only the latest window is rendered; each click reveals (and if needed loads) one more
+            shown = conversation.setdefault("shown", CHAT_RENDER_WINDOW)
+            if len(conversation["messages"]) > shown or conversation.get("spilled") or conversation.get("cursor"):
+                if st.button("Load earlier messages", key=f"earlier_{conv_id}"):
+                    conversation["shown"] = shown + CHAT_RENDER_WINDOW
+                    session_store.load_earlier(
+                        session_id, conv_id, conversation, conversation["shown"] - len(conversation["messages"]),
+                        lambda cursor: get_conversation_messages(st.session_state.user_data['uid'], conv_id, before=cursor)
+                    )
+                    st.rerun()
+
+            for message in conversation["messages"][-shown:]:
                 with st.chat_message(message["role"]):
                     st.markdown(message["content"])
 
@@ -346,34 +262,27 @@ if st.session_state.user_logged_in:
                 conversation["messages"].append({"role": "user", "content": prompt})
 
                 if len(conversation["messages"]) == 1:
-                    conversation["title"] = summarize_conversation(conversation["messages"])
-
-                if is_relevant_query(prompt, st.session_state.user_data):
-                    try:
-                        response = chain.invoke({"input": prompt, "intermediate_steps": []})
-                        
-                        if response.get('intermediate_steps') and response['intermediate_steps']:
-                            search_results = response['intermediate_steps'][0][1]
-                        else:
-                
-                            search_tool = TavilySearchResults(max_results=5)
-                            search_results = search_tool.invoke(prompt)
-                        
-                        formatted_results = format_search_results(search_results)
-                        overall_summary = generate_overall_summary(search_results)
-                        
-                        ai_response = f"{response['agent_outcome'].return_values['output']}\n\n{formatted_results}\nOverall Summary:\n{overall_summary}"
-                    except Exception as e:
-                        st.error(f"An error occurred while processing the search results: {str(e)}")
-                        ai_response = "I apologize, but I encountered an error while processing the search results. Please try your query again or rephrase it."
-                else:
-                    ai_response = "I apologize, but this query doesn't seem to be related to your department or interests. Would you like to rephrase your question or ask something more relevant?"
+                    conversation["title"] = start_conversation_title(
+                        conv_id, conversation["messages"],
+                        partial(rename_conversation, st.session_state.user_data['uid'], conv_id, conversation)
+                    )
 
                 with st.chat_message("assistant"):
-                    st.markdown(ai_response)
-    
+                    if is_relevant_query(prompt, st.session_state.user_data):
+                        try:
+                            ai_response = render_streamed_response(prompt, st.session_state.user_data, conversation_history(conversation))
+                        except Exception as e:
+                            st.error(f"An error occurred while processing the search results: {str(e)}")
+                            ai_response = "I apologize, but I encountered an error while processing the search results. Please try your query again or rephrase it."
+                            st.markdown(ai_response)
+                    else:
+                        ai_response = "I apologize, but this query doesn't seem to be related to your department or interests. Would you like to rephrase your question or ask something more relevant?"
+                        st.markdown(ai_response)
+
                 conversation["messages"].append({"role": "assistant", "content": ai_response})
-                data_to_firebase(prompt, ai_response, conversation["title"])
+                data_to_firebase(prompt, ai_response, conversation["title"], st.session_state.current_conversation_id)
+                session_store.spill(session_id, conv_id, conversation)
+                conversation["shown"] = CHAT_RENDER_WINDOW
 
                 st.rerun()
         else:
@@ -404,6 +313,63 @@ if st.session_state.user_logged_in:
 
             st.caption("News articles are tailored to your interests and skills, focusing on the most recent publications. Click 'Refresh Latest News' for up-to-the-minute updates.")
 
+    session_store.account(session_id, st.session_state.conversations)
+
+    if is_admin:
+        if CHAT_API_URL:
+            # The pipeline runs in server.py, so its numbers come from there
+            from api_client import get_metrics
+            pipeline_metrics = get_metrics()
+            where = "on the chat API server"
+        else:
+            from metrics import registry
+            from response_cache import get_response_cache
+            from relevance import get_relevance_classifier
+            from governor import get_governor
+            from breakers import breaker_stats
+            from summary_store import get_summary_store
+            pipeline_metrics = {
+                "stages": registry.summary(),
+                "response_cache": get_response_cache().snapshot(),
+                "summary_store": get_summary_store().snapshot(),
+                "relevance": get_relevance_classifier().stats,
+                "rate_limits": get_governor().stats(),
+                "breakers": breaker_stats()
+            }
+            where = "in this process"
+
+        with tabs[2]:
+            st.title("Pipeline Metrics")
+            st.caption(f"Latency percentiles cover the most recent calls per stage {where}; tokens and cost are running totals.")
+            st.dataframe(pipeline_metrics["stages"], use_container_width=True)
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.subheader("Response cache")
+                st.json(pipeline_metrics["response_cache"])
+            with col2:
+                st.subheader("Source summaries")
+                st.json(pipeline_metrics["summary_store"])
+            with col3:
+                st.subheader("Relevance gate")
+                st.json(pipeline_metrics["relevance"])
+
+            st.subheader("Rate limits")
+            st.caption("Calls granted and average queueing per priority lane, plus provider throttling and retries.")
+            st.json(pipeline_metrics["rate_limits"])
+
+            st.subheader("Circuit breakers")
+            st.caption("An open breaker skips its dependency and serves a degraded answer until a probe call succeeds.")
+            st.json(pipeline_metrics["breakers"])
+
+            st.subheader("Session memory")
+            st.caption("Messages held in session state across the sessions active in the last hour, and messages spilled out of them.")
+            st.json(session_store.snapshot())
+
+            if not CHAT_API_URL and st.button("Reset metrics", key="reset_metrics_button"):
+                registry.reset()
+                st.rerun()
+
 
 else:
     st.info("Please log in or sign up to access the chat interface.")
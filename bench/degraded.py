@@ -0,0 +1,62 @@
+import argparse
+import sys
+
+from bench.fakes import FakeOpenAIServer, FakeTavily, Latency
+from bench.run import configure_environment
+
+# Regression check for degraded mode: with every Tavily search failing, chat turns must still
+# answer, the search breaker must count the failures and trip, and nothing may be cached.
+
+
+def check(requests, stream):
+    from breakers import breaker_stats
+    from pipeline import run_chat, stream_chat
+    from response_cache import get_response_cache
+
+    failures = []
+    for i in range(requests):
+        prompt = f"What changed in consumer demand this quarter? ({i})"
+        try:
+            if stream:
+                response = [payload for kind, payload in stream_chat(prompt, scope="bench") if kind == "final"][-1]
+            else:
+                response = run_chat(prompt, scope="bench")
+        except Exception as e:
+            failures.append(f"request {i} raised {e!r}")
+            continue
+        if "No search results found." not in response:
+            failures.append(f"request {i} answered with sources while search was down")
+        if get_response_cache().get(prompt, "bench") is not None:
+            failures.append(f"request {i} was cached although it was degraded")
+
+    search = breaker_stats()["search"]
+    if search["failures"] == 0:
+        failures.append("search breaker recorded no failures")
+    if search["trips"] == 0:
+        failures.append("search breaker never tripped")
+    return failures, search
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that chat degrades cleanly when search is down")
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--stream", action="store_true", help="drive stream_chat instead of run_chat")
+    args = parser.parse_args(argv)
+
+    openai_server = FakeOpenAIServer(Latency(20, 5), 0).start()
+    configure_environment(openai_server)
+    tavily = FakeTavily(Latency(5, 1), failure_rate=1.0).install()
+    try:
+        failures, search = check(args.requests, args.stream)
+    finally:
+        tavily.uninstall()
+        openai_server.stop()
+
+    print(f"search breaker: {search}")
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytz
+
+WORDS = (
+    "godrej market growth customers products policy strategy quarter revenue digital supply chain "
+    "innovation sustainability launch region demand pricing analysts report industry technology team"
+).split()
+
+
+def pseudo_text(seed, words):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+class Latency:
+    # base and jitter in milliseconds; sample() returns seconds
+    def __init__(self, base=0.0, jitter=0.0):
+        self.base = base
+        self.jitter = jitter
+
+    def sample(self):
+        return max(0.0, self.base + random.uniform(-self.jitter, self.jitter)) / 1000
+
+
+class FakeOpenAIServer:
+    # OpenAI-compatible /v1/chat/completions with configurable latency and failures.
+    # Agent calls that offer functions get one tool call, then a text answer;
+    # JSON-mode prompts get a structurally valid object for the summarizer and news ranking.
+    def __init__(self, latency=None, token_delay=0.0, failure_rate=0.0, answer_words=60, host="127.0.0.1", port=0):
+        self.latency = latency or Latency()
+        self.token_delay = token_delay / 1000
+        self.failure_rate = failure_rate
+        self.answer_words = answer_words
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="fake-openai")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.failures = 0
+
+    def completion(self, body):
+        messages = body.get("messages", [])
+        prompt = "\n".join(str(message.get("content") or "") for message in messages)
+        has_function_result = any(message.get("role") in ("function", "tool") for message in messages)
+
+        if body.get("functions") and not has_function_result:
+            function = body["functions"][0]["name"]
+            return None, {"name": function, "arguments": json.dumps({"query": messages[-1].get("content", "")[:200]})}
+
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            return self.json_content(prompt), None
+        if "<<<SUMMARIES>>>" in prompt:
+            return self.synthesis_content(prompt), None
+        if "Respond with 'Yes' or 'No'" in prompt:
+            return "Yes", None
+        if "5 words or less" in prompt:
+            return pseudo_text(prompt, 4), None
+        return pseudo_text(prompt, self.answer_words), None
+
+    def synthesis_content(self, prompt):
+        # Single-pass fast path: answer text, the marker, then the structured summaries
+        count = int(re.search(r"following (\d+) search results", prompt).group(1))
+        return pseudo_text(prompt, self.answer_words) + "\n<<<SUMMARIES>>>\n" + json.dumps({
+            "summaries": [pseudo_text(f"{prompt}{i}", 40) for i in range(count)],
+            "overall": pseudo_text(prompt, 50)
+        })
+
+    def json_content(self, prompt):
+        sources = re.search(r"a list of (\d+) strings", prompt)
+        if sources:
+            count = int(sources.group(1))
+            return json.dumps({
+                "summaries": [pseudo_text(f"{prompt}{i}", 40) for i in range(count)],
+                "overall": pseudo_text(prompt, 50)
+            })
+
+        urls = re.findall(r"\[\d+\] (https?://\S+)", prompt)
+        today = datetime.now(pytz.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+        return json.dumps({"articles": [
+            {"title": pseudo_text(url, 8), "summary": pseudo_text(url + "s", 35), "url": url, "date": today, "source": url.split("/")[2]}
+            for url in urls[:10]
+        ]})
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.calls += 1
+                time.sleep(server.latency.sample())
+
+                if random.random() < server.failure_rate:
+                    with server._lock:
+                        server.failures += 1
+                    self.send_response(429)
+                    data = json.dumps({"error": {"message": "Rate limit reached", "type": "rate_limit"}}).encode("utf-8")
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.send_header("retry-after-ms", "200")
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+
+                content, function_call = server.completion(body)
+                model = body.get("model", "gpt-3.5-turbo")
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                finish_reason = "function_call" if function_call else "stop"
+
+                if not body.get("stream"):
+                    message = {"role": "assistant", "content": content}
+                    if function_call:
+                        message["function_call"] = function_call
+                    self._json(200, {
+                        "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+
+                def send(delta, finish=None):
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                send({"role": "assistant", "content": "" if function_call else None})
+                if function_call:
+                    send({"function_call": function_call})
+                else:
+                    for i, word in enumerate(content.split(" ")):
+                        time.sleep(server.token_delay)
+                        send({"content": word if i == 0 else " " + word})
+                send({}, finish_reason)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+class FakeTavily:
+    # Replaces TavilySearchAPIWrapper.raw_results with generated results.
+    # A share of URLs comes from a small popular pool so cross-query caches see repeats.
+    def __init__(self, latency=None, failure_rate=0.0, content_words=120, popular_share=0.4):
+        self.latency = latency or Latency()
+        self.failure_rate = failure_rate
+        self.content_words = content_words
+        self.popular_share = popular_share
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._original = None
+
+    def results(self, query, max_results=5):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency.sample())
+        if random.random() < self.failure_rate:
+            raise ConnectionError("Tavily search timed out")
+
+        seed = int(hashlib.sha1(query.encode("utf-8")).hexdigest(), 16)
+        rng = random.Random(seed)
+        now = datetime.now(pytz.utc)
+        results = []
+        for i in range(max_results):
+            if rng.random() < self.popular_share:
+                url = f"https://www.godrej.com/news/{rng.randint(1, 20)}"
+            else:
+                day = now - timedelta(days=rng.randint(0, 10))
+                url = f"https://www.reuters.com/business/{day:%Y/%m/%d}/story-{seed % 10000}-{i}/"
+            results.append({
+                "title": pseudo_text(url, 6),
+                "url": url,
+                "content": pseudo_text(url, self.content_words),
+                "score": round(rng.random(), 3),
+                "published_date": (now - timedelta(hours=rng.randint(1, 200))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            })
+        return {"query": query, "results": results}
+
+    def install(self):
+        from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+
+        fake = self
+        self._original = TavilySearchAPIWrapper.raw_results
+
+        def raw_results(wrapper, query, max_results=5, *args, **kwargs):
+            return fake.results(query, max_results)
+
+        TavilySearchAPIWrapper.raw_results = raw_results
+        return self
+
+    def uninstall(self):
+        from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+
+        if self._original is not None:
+            TavilySearchAPIWrapper.raw_results = self._original
+
+
+class FakeReference:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = "/".join(part for part in path.split("/") if part)
+        self._order = None
+        self._limit_last = None
+        self._end_at = None
+
+    def order_by_key(self):
+        self._order = "$key"
+        return self
+
+    def order_by_child(self, child):
+        self._order = child
+        return self
+
+    def limit_to_last(self, limit):
+        self._limit_last = limit
+        return self
+
+    def end_at(self, value):
+        self._end_at = value
+        return self
+
+    def get(self, etag=False, shallow=False):
+        return self.db.read(self)
+
+    def set(self, value):
+        self.db.write({self.path: value})
+
+    def update(self, value):
+        self.db.write({f"{self.path}/{key}".strip("/"): item for key, item in value.items()})
+
+
+class FakeRealtimeDatabase:
+    # In-memory stand-in for firebase_admin.db with the query subset this app uses
+    def __init__(self, latency=None, failure_rate=0.0):
+        self.latency = latency or Latency()
+        self.failure_rate = failure_rate
+        self.root = {}
+        self.reads = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def reference(self, path="/"):
+        return FakeReference(self, path)
+
+    def _node(self, path):
+        node = self.root
+        for part in [part for part in path.split("/") if part]:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def read(self, reference):
+        time.sleep(self.latency.sample())
+        with self._lock:
+            self.reads += 1
+            node = self._node(reference.path)
+            if not isinstance(node, dict) or reference._order is None:
+                return json.loads(json.dumps(node)) if node is not None else None
+            if reference._order == "$key":
+                items = sorted(node.items())
+            else:
+                items = sorted(node.items(), key=lambda item: (item[1].get(reference._order, 0) if isinstance(item[1], dict) else 0, item[0]))
+            if reference._end_at is not None:
+                items = [item for item in items if item[0] <= reference._end_at]
+            if reference._limit_last is not None:
+                items = items[-reference._limit_last:]
+            return OrderedDict(json.loads(json.dumps(items)))
+
+    def write(self, updates):
+        time.sleep(self.latency.sample())
+        if random.random() < self.failure_rate:
+            raise ConnectionError("Realtime Database unavailable")
+        with self._lock:
+            self.writes += 1
+            for path, value in updates.items():
+                parts = [part for part in path.split("/") if part]
+                node = self.root
+                for part in parts[:-1]:
+                    node = node.setdefault(part, {})
+                node[parts[-1]] = self.resolve(node.get(parts[-1]), value)
+
+    @staticmethod
+    def resolve(current, value):
+        if isinstance(value, dict) and ".sv" in value:
+            server_value = value[".sv"]
+            if server_value == "timestamp":
+                return int(time.time() * 1000)
+            return (current or 0) + server_value["increment"]
+        return json.loads(json.dumps(value))
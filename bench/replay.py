@@ -0,0 +1,130 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.run import percentile
+
+
+def configure_environment(args):
+    # Must run before the app modules are imported: they read these at import time
+    os.environ["CASSETTE_MODE"] = "replay"
+    os.environ["CASSETTE_PATH"] = args.cassette
+    os.environ["CASSETTE_LATENCY_SCALE"] = str(args.latency_scale)
+    os.environ["CASSETTE_STRICT"] = "0" if args.allow_live else "1"
+    os.environ.setdefault("METRICS_LOG", "0")
+    os.environ.setdefault("OPENAI_API_KEY", "replay")
+    os.environ.setdefault("TAVILY_API_KEY", "replay")
+    os.environ["WRITE_JOURNAL"] = ""
+    os.environ["SUMMARY_STORE_PATH"] = ""
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+
+def replay_request(request):
+    from langchain_core.messages import messages_from_dict
+    from news import get_recent_news
+    from pipeline import run_chat, stream_chat
+
+    payload = request["payload"]
+    if request["kind"] == "news":
+        get_recent_news(payload["user_data"], payload["num_articles"])
+    elif payload["streaming"]:
+        for _ in stream_chat(payload["prompt"], payload["scope"], messages_from_dict(payload["chat_history"]), payload.get("mode")):
+            pass
+    else:
+        run_chat(payload["prompt"], payload["scope"], messages_from_dict(payload["chat_history"]), payload.get("mode"))
+
+
+def replay(requests, concurrency, pace):
+    # pace > 0 keeps the recorded arrival pattern, scaled by that factor; 0 sends as fast as the pool allows
+    results = {}
+    lock = threading.Lock()
+
+    def run(request):
+        start = time.perf_counter()
+        error = None
+        try:
+            replay_request(request)
+        except Exception as e:
+            error = e
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            results.setdefault(request["kind"], []).append((request["latency_ms"], elapsed, error))
+
+    origin = requests[0]["at"] if requests else 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for request in requests:
+            if pace > 0:
+                delay = (request["at"] - origin) * pace - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(run, request)
+    return results, time.perf_counter() - start
+
+
+def build_report(results, elapsed, cassette):
+    report = {"elapsed_s": round(elapsed, 2), "cassette_hits": cassette.hits, "cassette_misses": cassette.misses, "kinds": []}
+    for kind, rows in sorted(results.items()):
+        recorded = [row[0] for row in rows]
+        replayed = [row[1] for row in rows]
+        report["kinds"].append({
+            "kind": kind,
+            "requests": len(rows),
+            "errors": sum(1 for row in rows if row[2] is not None),
+            "recorded_p50_ms": round(percentile(recorded, 0.50), 1),
+            "recorded_p95_ms": round(percentile(recorded, 0.95), 1),
+            "replayed_p50_ms": round(percentile(replayed, 0.50), 1),
+            "replayed_p95_ms": round(percentile(replayed, 0.95), 1),
+        })
+    return report
+
+
+def print_report(report):
+    print(f"\nreplayed in {report['elapsed_s']} s, cassette hits {report['cassette_hits']}, misses {report['cassette_misses']}")
+    print(f"  {'kind':<8}{'requests':>10}{'errors':>8}{'rec_p50':>10}{'rec_p95':>10}{'new_p50':>10}{'new_p95':>10}")
+    for row in report["kinds"]:
+        print(
+            f"  {row['kind']:<8}{row['requests']:>10}{row['errors']:>8}{row['recorded_p50_ms']:>10}"
+            f"{row['recorded_p95_ms']:>10}{row['replayed_p50_ms']:>10}{row['replayed_p95_ms']:>10}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay traffic recorded with CASSETTE_MODE=record against this build")
+    parser.add_argument("--cassette", default="cassette.db")
+    parser.add_argument("--kind", choices=["chat", "news"], help="only replay one kind of request")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pace", type=float, default=0.0, help="scale for the recorded inter-arrival times, 0 for back-to-back")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="scale for recorded LLM and search latencies")
+    parser.add_argument("--allow-live", action="store_true", help="send unrecorded calls to the live APIs instead of failing")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.cassette):
+        print(f"{args.cassette} not found, record one with CASSETTE_MODE=record", file=sys.stderr)
+        return 1
+    configure_environment(args)
+
+    import cassette
+
+    store = cassette.install(args.cassette, "replay", args.latency_scale, not args.allow_live)
+    requests = store.requests(args.kind)
+    results, elapsed = replay(requests, args.concurrency, args.pace)
+    report = build_report(results, elapsed, store)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if any(row["errors"] for row in report["kinds"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fakes import FakeOpenAIServer, FakeRealtimeDatabase, FakeTavily, Latency
+
+PROFILES = [
+    {"department": "Marketing", "interests": ["digital advertising", "consumer trends"], "skills": ["SEO", "analytics"]},
+    {"department": "Supply Chain", "interests": ["logistics", "sustainability"], "skills": ["forecasting", "SAP"]},
+    {"department": "Finance", "interests": ["markets", "consumer trends"], "skills": ["valuation", "excel"]},
+    {"department": "Engineering", "interests": ["AI", "cloud"], "skills": ["python", "data engineering"]},
+]
+
+QUERIES = [
+    "What are the latest Godrej product launches?",
+    "latest godrej product launches",
+    "How is consumer demand trending this quarter?",
+    "Summarize recent supply chain sustainability initiatives",
+    "What AI tools are companies in our industry adopting?",
+    "Any news on digital advertising regulation?",
+    "What does the latest market report say about pricing?",
+    "Tell me more about that",
+]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def configure_environment(openai_server):
+    # Must run before the app modules are imported: they read these at import time
+    os.environ.setdefault("METRICS_LOG", "0")
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["TAVILY_API_KEY"] = "bench"
+    os.environ["OPENAI_API_BASE"] = openai_server.base_url
+    os.environ["OPENAI_BASE_URL"] = openai_server.base_url
+    os.environ["WRITE_JOURNAL"] = ""
+    os.environ["SUMMARY_STORE_PATH"] = ""
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.first_token = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds, first_token=None, error=False):
+        with self._lock:
+            self.latencies.append(seconds * 1000)
+            if first_token is not None:
+                self.first_token.append(first_token * 1000)
+            if error:
+                self.errors += 1
+
+
+def simulate_chat_user(user_id, profile, requests, stream, recorder, write_queue, think_time):
+    from context import conversation_history
+    from history import record_turn
+    from pipeline import run_chat, stream_chat
+    from relevance import is_relevant_query
+    from response_cache import cache_scope
+
+    rng = random.Random(user_id)
+    user_data = dict(profile, uid=f"bench-user-{user_id}")
+    conversation = {"title": "Benchmark", "messages": []}
+    conversation_id = f"bench-conversation-{user_id}"
+
+    for _ in range(requests):
+        prompt = rng.choice(QUERIES)
+        conversation["messages"].append({"role": "user", "content": prompt})
+        start = time.perf_counter()
+        first_token = None
+        try:
+            if not is_relevant_query(prompt, user_data):
+                response = "Not relevant"
+            elif stream:
+                response = ""
+                for kind, payload in stream_chat(prompt, scope=cache_scope(user_data), chat_history=conversation_history(conversation)):
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    if kind == "final":
+                        response = payload
+            else:
+                response = run_chat(prompt, scope=cache_scope(user_data), chat_history=conversation_history(conversation))
+            record_turn(write_queue.enqueue, user_data["uid"], conversation_id, prompt, response, conversation["title"])
+            conversation["messages"].append({"role": "assistant", "content": response})
+            recorder.add(time.perf_counter() - start, first_token)
+        except Exception:
+            conversation["messages"].pop()
+            recorder.add(time.perf_counter() - start, error=True)
+        time.sleep(think_time)
+
+
+def simulate_news_user(user_id, profile, requests, recorder, think_time):
+    from news import get_recent_news
+
+    user_data = dict(profile, uid=f"bench-user-{user_id}")
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            get_recent_news(user_data)
+            recorder.add(time.perf_counter() - start)
+        except Exception:
+            recorder.add(time.perf_counter() - start, error=True)
+        time.sleep(think_time)
+
+
+def run_scenario(name, worker, users, openai_server, tavily, database):
+    from metrics import registry
+
+    registry.reset()
+    openai_server.reset()
+    llm_calls, search_calls, db_writes = openai_server.calls, tavily.calls, database.writes
+    recorder = Recorder()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        for future in [executor.submit(worker, user_id, recorder) for user_id in range(users)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    requests = len(recorder.latencies)
+    report = {
+        "scenario": name,
+        "users": users,
+        "requests": requests,
+        "errors": recorder.errors,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(recorder.latencies, 0.50), 1),
+        "p95_ms": round(percentile(recorder.latencies, 0.95), 1),
+        "p99_ms": round(percentile(recorder.latencies, 0.99), 1),
+        "llm_calls_per_request": round((openai_server.calls - llm_calls) / requests, 2) if requests else 0.0,
+        "searches_per_request": round((tavily.calls - search_calls) / requests, 2) if requests else 0.0,
+        "db_writes": database.writes - db_writes,
+        "stages": registry.summary(),
+    }
+    if recorder.first_token:
+        report["first_event_p50_ms"] = round(percentile(recorder.first_token, 0.50), 1)
+        report["first_event_p95_ms"] = round(percentile(recorder.first_token, 0.95), 1)
+    return report
+
+
+def print_report(report):
+    print(f"\n== {report['scenario']} ==")
+    for key, value in report.items():
+        if key not in ("scenario", "stages"):
+            print(f"  {key:<24} {value}")
+    print(f"  {'stage':<28}{'count':>7}{'p50_ms':>10}{'p95_ms':>10}{'tokens':>10}")
+    for stage in report["stages"]:
+        tokens = stage["prompt_tokens"] + stage["completion_tokens"]
+        print(f"  {stage['stage']:<28}{stage['count']:>7}{stage['p50_ms']:>10}{stage['p95_ms']:>10}{tokens:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load benchmark for the chat and news pipelines")
+    parser.add_argument("--scenario", choices=["chat", "news", "all"], default="all")
+    parser.add_argument("--users", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=5, help="requests per user")
+    parser.add_argument("--stream", action="store_true", help="drive stream_chat instead of run_chat")
+    parser.add_argument("--mode", choices=["agent", "fast", "auto"], help="chat pipeline mode, defaults to PIPELINE_MODE")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between a user's requests")
+    parser.add_argument("--llm-latency", type=float, default=300, help="ms per LLM call")
+    parser.add_argument("--llm-jitter", type=float, default=100)
+    parser.add_argument("--token-delay", type=float, default=2, help="ms between streamed tokens")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--search-latency", type=float, default=400, help="ms per Tavily search")
+    parser.add_argument("--search-jitter", type=float, default=150)
+    parser.add_argument("--search-failure-rate", type=float, default=0.0)
+    parser.add_argument("--db-latency", type=float, default=60, help="ms per Realtime Database call")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--max-p95", type=float, help="exit non-zero if any scenario's p95 exceeds this many ms")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    openai_server = FakeOpenAIServer(Latency(args.llm_latency, args.llm_jitter), args.token_delay, args.llm_failure_rate).start()
+    configure_environment(openai_server)
+    if args.mode:
+        os.environ["PIPELINE_MODE"] = args.mode
+    tavily = FakeTavily(Latency(args.search_latency, args.search_jitter), args.search_failure_rate).install()
+    database = FakeRealtimeDatabase(Latency(args.db_latency, args.db_latency / 4))
+
+    import history
+    from write_behind import WriteBehindQueue
+
+    history.db = database
+    write_queue = WriteBehindQueue(lambda updates: database.reference("/").update(updates))
+
+    reports = []
+    try:
+        if args.scenario in ("chat", "all"):
+            reports.append(run_scenario(
+                "chat (stream)" if args.stream else "chat",
+                lambda user_id, recorder: simulate_chat_user(
+                    user_id, PROFILES[user_id % len(PROFILES)], args.requests, args.stream, recorder, write_queue, args.think_time
+                ),
+                args.users, openai_server, tavily, database
+            ))
+            write_queue.flush(30)
+        if args.scenario in ("news", "all"):
+            reports.append(run_scenario(
+                "news",
+                lambda user_id, recorder: simulate_news_user(user_id, PROFILES[user_id % len(PROFILES)], args.requests, recorder, args.think_time),
+                args.users, openai_server, tavily, database
+            ))
+    finally:
+        write_queue.close()
+        tavily.uninstall()
+        openai_server.stop()
+
+    for report in reports:
+        print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+
+    if args.max_p95 is not None and any(report["p95_ms"] > args.max_p95 for report in reports):
+        print(f"\np95 above the {args.max_p95} ms budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import streamlit as st
+
+from metrics import annotate, submit
+
+# Consecutive failures (errors or blown budgets) that open a breaker, and how long it
+# stays open before a single probe call is let through
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "3"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+# Latency budget per dependency, in seconds
+SEARCH_BUDGET = float(os.getenv("SEARCH_BUDGET", "10"))
+SUMMARY_BUDGET = float(os.getenv("SUMMARY_BUDGET", "10"))
+RELEVANCE_BUDGET = float(os.getenv("RELEVANCE_BUDGET", "5"))
+# Worker threads per breaker. Each dependency has its own pool, so calls abandoned past their
+# budget on a hung provider never hold up another dependency's calls
+BREAKER_WORKERS = int(os.getenv("BREAKER_WORKERS", "16"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_degraded = contextvars.ContextVar("degraded", default=None)
+
+
+class DependencyUnavailable(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def track_degradation():
+    # Collects the names of breakers that fell back anywhere under this request,
+    # including on threads started through metrics.bind_context
+    degraded = set()
+    token = _degraded.set(degraded)
+    try:
+        yield degraded
+    finally:
+        _degraded.reset(token)
+
+
+def is_degraded():
+    return bool(_degraded.get())
+
+
+def mark_degraded(name):
+    degraded = _degraded.get()
+    if degraded is not None:
+        degraded.add(name)
+    annotate(degraded=name)
+
+
+class CircuitBreaker:
+    def __init__(self, name, budget, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET, workers=BREAKER_WORKERS):
+        self.name = name
+        self.budget = budget
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"breaker-{name}")
+        self._slots = threading.BoundedSemaphore(workers)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.stats = {"calls": 0, "failures": 0, "timeouts": 0, "rejected": 0, "saturated": 0, "trips": 0}
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = CLOSED
+            self._probing = False
+
+    def record_failure(self, timeout=False):
+        with self._lock:
+            self.stats["timeouts" if timeout else "failures"] += 1
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.stats["trips"] += 1
+
+    def submit(self, fn, *args):
+        # Starts fn on this breaker's pool without waiting for it. The caller collects the future
+        # within self.budget and hands the ones still running to abandon(). Raises
+        # DependencyUnavailable at once while open or out of workers.
+        if not self.allow():
+            mark_degraded(self.name)
+            raise DependencyUnavailable(f"{self.name} circuit is open")
+
+        # Every worker still busy with an abandoned call: fail fast instead of queueing behind them
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats["saturated"] += 1
+            mark_degraded(self.name)
+            raise DependencyUnavailable(f"{self.name} has no free worker")
+
+        with self._lock:
+            self.stats["calls"] += 1
+        abandoned = threading.Event()
+        future = submit(self.executor, self._run, abandoned, fn, *args)
+        future.abandoned = abandoned
+        return future
+
+    def _run(self, abandoned, fn, *args):
+        # The outcome is recorded before the future resolves; an abandoned call already counted as a timeout
+        try:
+            result = fn(*args)
+        except Exception:
+            if not abandoned.is_set():
+                self.record_failure()
+            raise
+        finally:
+            self._slots.release()
+        if not abandoned.is_set():
+            self.record_success()
+        return result
+
+    def abandon(self, future):
+        # The call keeps its worker until it returns; the caller moves on now
+        future.abandoned.set()
+        # A call that never started gives its worker slot back here
+        if future.cancel():
+            self._slots.release()
+        self.record_failure(timeout=True)
+        mark_degraded(self.name)
+
+    def call(self, fn, *args, fallback=None):
+        # Runs fn within the latency budget. While open, or when the call fails or runs
+        # over, fallback() is returned if given, otherwise DependencyUnavailable is raised.
+        try:
+            future = self.submit(fn, *args)
+        except DependencyUnavailable:
+            if fallback is None:
+                raise
+            return fallback()
+
+        try:
+            return future.result(timeout=self.budget)
+        except FutureTimeoutError:
+            self.abandon(future)
+            return self.degrade(fallback, f"{self.name} exceeded its {self.budget:.0f}s budget")
+        except Exception as e:
+            if fallback is None:
+                raise
+            return self.degrade(fallback, str(e))
+
+    def degrade(self, fallback, reason):
+        mark_degraded(self.name)
+        if fallback is None:
+            raise DependencyUnavailable(reason)
+        return fallback()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, state=self.state, budget_s=self.budget)
+
+
+@st.cache_resource(show_spinner=False)
+def get_breakers():
+    return {
+        "search": CircuitBreaker("search", SEARCH_BUDGET),
+        "summarizer": CircuitBreaker("summarizer", SUMMARY_BUDGET),
+        "relevance": CircuitBreaker("relevance", RELEVANCE_BUDGET)
+    }
+
+
+def get_breaker(name):
+    return get_breakers()[name]
+
+
+def breaker_stats():
+    return {name: breaker.snapshot() for name, breaker in get_breakers().items()}
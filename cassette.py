@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import warnings
+
+from langchain_core.caches import BaseCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.load import dumps, loads
+
+# off | record | replay. Recording captures every LLM call and Tavily search (plus the
+# incoming chat and news requests) so a run can later be replayed without external APIs.
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off")
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassette.db")
+# 1.0 replays with the recorded latencies, 0 replays instantly
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))
+# In strict replay a call that was never recorded fails instead of reaching the live API
+CASSETTE_STRICT = os.getenv("CASSETTE_STRICT", "1") == "1"
+
+VOLATILE = [
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}([ T]\d{2}:?\d{2}:?\d{2}(\.\d+)?)?( ?UTC|Z)?"), "<date>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b"), "<uuid>"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+# Connection settings differ between the recording host and the replay host but never change the answer
+CONNECTION_PARAMS = {"openai_api_base", "openai_api_key", "openai_organization", "openai_proxy", "max_retries", "request_timeout", "streaming"}
+
+
+class CassetteMiss(KeyError):
+    pass
+
+
+def normalize(text):
+    for pattern, replacement in VOLATILE:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def llm_identity(llm_string):
+    params, _, stop = llm_string.partition("---")
+    try:
+        kwargs = json.loads(params).get("kwargs", {})
+    except ValueError:
+        return llm_string
+    kwargs = {name: value for name, value in kwargs.items() if name not in CONNECTION_PARAMS}
+    return json.dumps(kwargs, sort_keys=True) + stop
+
+
+def cassette_key(kind, *parts):
+    return hashlib.sha1("\x1f".join([kind] + [normalize(str(part)) for part in parts]).encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path=CASSETTE_PATH, mode=CASSETTE_MODE, latency_scale=CASSETTE_LATENCY_SCALE, strict=CASSETTE_STRICT):
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS calls (kind TEXT, key TEXT, payload TEXT, latency_ms REAL, PRIMARY KEY (kind, key))")
+        self._db.execute("CREATE TABLE IF NOT EXISTS requests (id INTEGER PRIMARY KEY AUTOINCREMENT, at REAL, kind TEXT, payload TEXT, latency_ms REAL)")
+        self._db.commit()
+
+    def record(self, kind, key, payload, latency):
+        with self._lock:
+            # First recording wins so replays stay deterministic
+            self._db.execute(
+                "INSERT OR IGNORE INTO calls (kind, key, payload, latency_ms) VALUES (?, ?, ?, ?)",
+                (kind, key, payload, latency * 1000)
+            )
+            self._db.commit()
+
+    def replay(self, kind, key):
+        with self._lock:
+            row = self._db.execute("SELECT payload, latency_ms FROM calls WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            if self.strict:
+                raise CassetteMiss(f"No recorded {kind} call for key {key}")
+            return None
+        time.sleep(row[1] / 1000 * self.latency_scale)
+        return row[0]
+
+    def call(self, kind, key, fn, encode=json.dumps, decode=json.loads, keep=None):
+        if self.mode == "replay":
+            payload = self.replay(kind, key)
+            if payload is not None:
+                return decode(payload)
+        start = time.perf_counter()
+        result = fn()
+        if self.mode == "record" and (keep is None or keep(result)):
+            self.record(kind, key, encode(result), time.perf_counter() - start)
+        return result
+
+    def record_request(self, kind, payload, latency):
+        if self.mode != "record":
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO requests (at, kind, payload, latency_ms) VALUES (?, ?, ?, ?)",
+                (time.time(), kind, json.dumps(payload), latency * 1000)
+            )
+            self._db.commit()
+
+    def requests(self, kind=None):
+        query = "SELECT at, kind, payload, latency_ms FROM requests" + (" WHERE kind = ?" if kind else "") + " ORDER BY id"
+        with self._lock:
+            rows = self._db.execute(query, (kind,) if kind else ()).fetchall()
+        return [{"at": at, "kind": row_kind, "payload": json.loads(payload), "latency_ms": latency} for at, row_kind, payload, latency in rows]
+
+
+class CassetteLLMCache(BaseCache):
+    # LangChain consults the global LLM cache before every model call, streaming or not,
+    # which makes it the one hook that covers predict, the agent inside chain.invoke and JSON-mode calls.
+    def __init__(self, cassette):
+        self.cassette = cassette
+        # Start times per (prompt, thread): lookup and update run on the caller's thread, so
+        # concurrent calls with the same prompt each keep their own latency
+        self._started = {}
+
+    def lookup(self, prompt, llm_string):
+        key = cassette_key("llm", llm_identity(llm_string), prompt)
+        if self.cassette.mode == "replay":
+            payload = self.cassette.replay("llm", key)
+            if payload is not None:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    return loads(payload)
+            return None
+        self._started[(key, threading.get_ident())] = time.perf_counter()
+        return None
+
+    def update(self, prompt, llm_string, return_val):
+        if self.cassette.mode != "record":
+            return
+        key = cassette_key("llm", llm_identity(llm_string), prompt)
+        started = self._started.pop((key, threading.get_ident()), time.perf_counter())
+        self.cassette.record("llm", key, dumps(return_val), time.perf_counter() - started)
+
+    def clear(self, **kwargs):
+        pass
+
+
+def install_search_hook(cassette):
+    from langchain_community.tools.tavily_search import TavilySearchResults
+
+    if getattr(TavilySearchResults._run, "cassette", None) is cassette:
+        return
+    original_run = TavilySearchResults._run
+
+    def _run(self, query, run_manager=None):
+        key = cassette_key("search", query, self.max_results, self.include_domains, self.exclude_domains)
+        # A failed search returns the error's repr instead of a result list; recording it
+        # would replay the outage for that query forever, since the first recording wins
+        result = cassette.call("search", key, lambda: list(original_run(self, query, run_manager)), keep=lambda result: isinstance(result[0], list))
+        return tuple(result)
+
+    _run.cassette = cassette
+    TavilySearchResults._run = _run
+
+
+_active = None
+_install_lock = threading.Lock()
+
+
+def install(path=CASSETTE_PATH, mode=CASSETTE_MODE, latency_scale=CASSETTE_LATENCY_SCALE, strict=CASSETTE_STRICT):
+    global _active
+    with _install_lock:
+        if mode == "off":
+            return None
+        if _active is None or _active.path != path or _active.mode != mode:
+            _active = Cassette(path, mode, latency_scale, strict)
+            set_llm_cache(CassetteLLMCache(_active))
+            install_search_hook(_active)
+        return _active
+
+
+def active():
+    return _active
+
+
+def record_request(kind, payload, latency):
+    if _active is not None:
+        _active.record_request(kind, payload, latency)
@@ -0,0 +1,85 @@
+import math
+import os
+import re
+
+from metrics import span
+from relevance import keywords
+from tokens import count_tokens
+
+# Token budget per source once duplicates and boilerplate are gone
+SOURCE_TOKEN_BUDGET = int(os.getenv("SOURCE_TOKEN_BUDGET", "220"))
+NEWS_SOURCE_TOKEN_BUDGET = int(os.getenv("NEWS_SOURCE_TOKEN_BUDGET", "120"))
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\s*\n+\s*")
+BOILERPLATE = re.compile(
+    r"cookie|privacy policy|terms of (use|service)|all rights reserved|subscribe|sign up|sign in|log in|"
+    r"newsletter|advertisement|click here|read more|share (this|on)|follow us|download the app|"
+    r"javascript|your browser|skip to (main )?content|related (articles|stories)",
+    re.IGNORECASE
+)
+MIN_SENTENCE_WORDS = 4
+
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE_END.split(text or "") if sentence.strip()]
+
+
+def fingerprint(sentence):
+    return " ".join(re.findall(r"[a-z0-9]+", sentence.lower()))
+
+
+def is_boilerplate(sentence):
+    return len(sentence.split()) < MIN_SENTENCE_WORDS or bool(BOILERPLATE.search(sentence))
+
+
+def rank_sentences(sentences, query_keywords):
+    # Query overlap normalized by sentence length, with a small bonus for lead sentences,
+    # which is where news copy puts its facts
+    scored = []
+    for position, sentence in enumerate(sentences):
+        sentence_keywords = keywords(sentence)
+        overlap = len(sentence_keywords & query_keywords) / math.sqrt(len(sentence_keywords) or 1)
+        scored.append((overlap + 0.5 / (position + 1), position))
+    return [position for _, position in sorted(scored, key=lambda item: (-item[0], item[1]))]
+
+
+def compact_text(sentences, query_keywords, budget):
+    chosen = []
+    used = 0
+    for position in rank_sentences(sentences, query_keywords):
+        tokens = count_tokens(sentences[position])
+        if used + tokens > budget:
+            continue
+        chosen.append(position)
+        used += tokens
+    # Back in reading order so the summary still sees coherent text
+    return " ".join(sentences[position] for position in sorted(chosen))
+
+
+def compact_results(results, query="", budget=SOURCE_TOKEN_BUDGET):
+    # Returns copies of the results with 'content' cut down to the budget; titles and URLs are untouched
+    if not isinstance(results, list):
+        return results
+
+    with span("compact", sources=len(results)) as record:
+        query_keywords = keywords(query or "")
+        seen = set()
+        compacted = []
+        before = after = 0
+        for result in results:
+            content = result.get('content') or ""
+            before += count_tokens(content)
+            sentences = []
+            for sentence in split_sentences(content):
+                key = fingerprint(sentence)
+                # Syndicated copy repeats across sources; keep the first occurrence only
+                if key in seen or is_boilerplate(sentence):
+                    continue
+                seen.add(key)
+                sentences.append(sentence)
+            text = compact_text(sentences, query_keywords, budget) or content[:budget * 4]
+            after += count_tokens(text)
+            compacted.append(dict(result, content=text))
+
+        record["prompt_tokens_saved"] = max(0, before - after)
+        return compacted
@@ -0,0 +1,73 @@
+import os
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from resources import get_llm
+from tokens import count_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_TURNS = int(os.getenv("CONTEXT_TURNS", "4"))
+SOURCE_MARKERS = ("\n\nTop 5 Sources:", "\n\nNo search results found.", "\nOverall Summary:")
+
+def strip_sources(content):
+    # Assistant messages embed the source list and overall summary after the answer
+    end = len(content)
+    for marker in SOURCE_MARKERS:
+        position = content.find(marker)
+        if position != -1:
+            end = min(end, position)
+    return content[:end].strip()
+
+
+def message_text(message):
+    content = message["content"]
+    return strip_sources(content) if message["role"] == "assistant" else content.strip()
+
+
+def summarize_turns(summary, messages):
+    transcript = "\n".join(f"{message['role'].title()}: {message_text(message)}" for message in messages)
+    prompt = f"""
+    Update the running summary of a conversation with the new turns below.
+    Keep the facts, names and open questions a follow-up question might refer to, in under 150 words.
+
+    Running summary:
+    {summary or "(empty)"}
+
+    New turns:
+    {transcript}
+
+    Updated summary:
+    """
+    return get_llm().predict(prompt).strip()
+
+
+def window_tokens(summary, messages):
+    return count_tokens(summary) + sum(count_tokens(message_text(message)) for message in messages)
+
+
+def conversation_history(conversation, budget=CONTEXT_TOKEN_BUDGET, turns=CONTEXT_TURNS):
+    # History for the agent's chat_history slot: a rolling summary of older turns plus the
+    # latest turns verbatim. The summary state lives on the conversation and only grows
+    # when turns leave the window, so older turns are never summarized twice.
+    state = conversation.setdefault("context", {"summary": "", "folded": 0})
+    history = conversation["messages"][:-1]
+    folded = min(state["folded"], len(history))
+    window = history[folded:]
+
+    if len(window) > 2 * turns or window_tokens(state["summary"], window) > budget:
+        # Fold down to half the window so the next few turns need no summary call
+        keep = len(window)
+        while keep > 0 and (keep > turns or window_tokens(state["summary"], window[len(window) - keep:]) > budget):
+            keep -= 2
+        keep = max(keep, 0)
+        state["summary"] = summarize_turns(state["summary"], window[:len(window) - keep])
+        state["folded"] = folded + len(window) - keep
+        window = window[len(window) - keep:]
+
+    chat_history = []
+    if state["summary"]:
+        chat_history.append(SystemMessage(content=f"Summary of the earlier conversation: {state['summary']}"))
+    for message in window:
+        message_class = HumanMessage if message["role"] == "user" else AIMessage
+        chat_history.append(message_class(content=message_text(message)))
+    return chat_history
@@ -0,0 +1,111 @@
+import json
+import os
+import re
+
+from langchain_core.messages import HumanMessage
+
+from metrics import span
+from resources import get_llm
+
+# "agent" always runs the functions-agent graph, "fast" always runs the single-pass
+# search-then-synthesize path, "auto" picks per query with choose_mode
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "agent")
+# Separates the streamed answer from the structured summaries in the single synthesis call
+SECTION_MARKER = "<<<SUMMARIES>>>"
+
+MULTI_STEP = re.compile(
+    r"\b(compare|comparison|versus|vs|difference between|differences between|step by step|and then|"
+    r"pros and cons|calculate|break down|timeline of)\b",
+    re.IGNORECASE
+)
+FOLLOW_UP = re.compile(
+    r"^\s*(and|also|what about|how about|tell me more|more on|why|elaborate)\b|\b(it|that|this|those|these|they|them)\b",
+    re.IGNORECASE
+)
+
+
+def is_follow_up(prompt, chat_history=None):
+    # A question that refers back to earlier turns; standalone questions in a long thread are not
+    return bool(chat_history) and bool(FOLLOW_UP.search(prompt))
+
+
+def choose_mode(prompt, chat_history=None, mode=None):
+    mode = mode or PIPELINE_MODE
+    if mode != "auto":
+        return mode
+    # One search answers most questions; comparisons, multi-part questions and follow-ups
+    # that lean on earlier turns need the agent to plan its own searches
+    if MULTI_STEP.search(prompt) or prompt.count("?") > 1:
+        return "agent"
+    if is_follow_up(prompt, chat_history):
+        return "agent"
+    return "fast"
+
+
+def synthesis_prompt(prompt, results):
+    sources = "\n\n".join(
+        f"[{i}] {result.get('title') or 'Untitled'} - {result.get('url', '')}\n{result.get('content', '')}"
+        for i, result in enumerate(results, 1)
+    ) or "No search results were found."
+    return f"""
+    Answer the question below using the following {len(results)} search results, and your own knowledge where they fall short.
+
+    Question: {prompt}
+
+    Search results:
+    {sources}
+
+    Write the answer for the user first, in plain prose. Then, on a line of its own, write {SECTION_MARKER} followed by a JSON object with two keys:
+    "summaries", a list of {len(results)} three-line summaries, one per search result in order, and "overall", a concise overall summary of all the results.
+    """
+
+
+class AnswerStream:
+    # Forwards streamed tokens up to the section marker, holding back just enough
+    # text to catch a marker split across tokens
+    def __init__(self, on_token):
+        self.on_token = on_token
+        self.buffer = ""
+        self.done = False
+
+    def feed(self, token):
+        if self.done:
+            return
+        self.buffer += token
+        if SECTION_MARKER in self.buffer:
+            self.done = True
+            text = self.buffer.split(SECTION_MARKER, 1)[0]
+        else:
+            keep = len(SECTION_MARKER) - 1
+            text, self.buffer = self.buffer[:-keep], self.buffer[-keep:]
+        if text:
+            self.on_token(text)
+
+    def flush(self):
+        if not self.done and self.buffer:
+            self.on_token(self.buffer)
+        self.buffer = ""
+
+
+def parse_synthesis(text, count):
+    # Returns (answer, summaries, overall); the last two are None when the structured part is unusable
+    answer, _, structured = text.partition(SECTION_MARKER)
+    structured = structured.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    try:
+        data = json.loads(structured) if structured else {}
+    except ValueError:
+        data = {}
+    summaries = data.get("summaries") if isinstance(data, dict) else None
+    overall = data.get("overall") if isinstance(data, dict) else None
+    if not isinstance(summaries, list) or len(summaries) != count or not isinstance(overall, str) or not overall.strip():
+        return answer.strip(), None, None
+    return answer.strip(), [str(summary).strip() for summary in summaries], overall.strip()
+
+
+def synthesize(prompt, results, chat_history=None, callbacks=None):
+    # One LLM call for the answer, every per-source summary and the overall summary
+    config = {"callbacks": callbacks} if callbacks else {}
+    with span("synthesize", sources=len(results), history_messages=len(chat_history or [])):
+        messages = list(chat_history or []) + [HumanMessage(content=synthesis_prompt(prompt, results))]
+        response = get_llm().invoke(messages, config=config)
+    return parse_synthesis(response.content, len(results))
@@ -1,10 +1,13 @@
-import firebase_admin
-from firebase_admin import credentials, auth, db
 import streamlit as st
 import os
 from dotenv import load_dotenv
 import datetime
+import hashlib
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+# firebase_admin, history and the write queue are imported inside the functions that use
+# them, so the login form renders without waiting for them (startup.py warms them up)
 
 load_dotenv()
 
@@ -29,13 +32,69 @@ def get_firebase_credentials():
     return creds
 
 # Initialize Firebase only if it hasn't been initialized yet
-if not firebase_admin._apps:
-    firebase_cred = get_firebase_credentials()
-    cred = credentials.Certificate(firebase_cred)
+@st.cache_resource(show_spinner=False)
+def init_firebase():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    if not firebase_admin._apps:
+        firebase_cred = get_firebase_credentials()
+        cred = credentials.Certificate(firebase_cred)
+
+        firebase_admin.initialize_app(cred, {
+            'databaseURL': os.getenv("FIREBASE_DATABASE_URL")
+        })
+
+def firebase():
+    init_firebase()
+    from firebase_admin import auth, db
+    return auth, db
+
+# Chat turns and login logs are written by a background worker, batched into multi-path updates
+@st.cache_resource(show_spinner=False)
+def get_write_queue():
+    from write_behind import start_write_queue
+
+    _, db = firebase()
+    return start_write_queue(lambda updates: db.reference('/').update(updates))
+
+@st.cache_resource(show_spinner=False)
+def get_auth_executor():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="auth")
+
+# user_directory/{email hash} -> uid lets the profile read start without waiting for Firebase Auth
+def email_key(email):
+    return hashlib.sha1(email.strip().lower().encode("utf-8")).hexdigest()
+
+def read_info_by_email(email):
+    from history import load_conversation_index
 
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': os.getenv("FIREBASE_DATABASE_URL")
-    })
+    _, db = firebase()
+    uid = db.reference(f'user_directory/{email_key(email)}').get()
+    if not uid:
+        return None
+    # The conversation index is needed right after login, so start loading it now
+    get_auth_executor().submit(load_conversation_index, uid)
+    return db.reference(f'users/{uid}/info').get()
+
+def lookup_user(email):
+    auth, db = firebase()
+    executor = get_auth_executor()
+    user_future = executor.submit(auth.get_user_by_email, email)
+    info_future = executor.submit(read_info_by_email, email)
+
+    user = user_future.result()
+    try:
+        user_data = info_future.result()
+    except Exception:
+        user_data = None
+
+    if not user_data or user_data.get('uid') != user.uid:
+        # Accounts created before the directory existed: read by uid and backfill the entry
+        user_data = db.reference(f'users/{user.uid}/info').get()
+        if user_data:
+            get_write_queue().enqueue(f'user_directory/{email_key(email)}', user.uid)
+    return user, user_data
 
 def login():
     st.title("Login")
@@ -43,9 +102,9 @@ def login():
     password = st.text_input("Password", type="password", key="login_password")
     
     if st.button("Login", key="login_button"):
+        auth, _ = firebase()
         try:
-            user = auth.get_user_by_email(email)
-            user_data = db.reference(f'users/{user.uid}/info').get()
+            user, user_data = lookup_user(email)
             if user_data:
                 st.session_state.user_data = user_data
                 st.success("Logged in successfully!")
@@ -70,6 +129,7 @@ def signup():
     skills = st.text_input("Skills (comma-separated)", key="signup_skills")
     
     if st.button("Sign Up", key="signup_button"):
+        auth, db = firebase()
         try:
             user = auth.create_user(
                 email=email,
@@ -82,7 +142,10 @@ def signup():
                 "skills": skills.split(','),
                 "uid": user.uid
             }
-            db.reference(f'users/{user.uid}/info').set(user_data)
+            db.reference('/').update({
+                f'users/{user.uid}/info': user_data,
+                f'user_directory/{email_key(email)}': user.uid
+            })
             st.session_state.user_data = user_data
             st.success("Account created successfully!")
             return True
@@ -93,61 +156,66 @@ def signup():
     return False
 
 def log_to_firebase(uid, email, status, error_message=None):
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%dT%H%M%S")
+    from write_behind import unique_key
+
+    now = datetime.datetime.now()
+    timestamp = now.strftime("%Y-%m-%dT%H%M%S")
     log_data = {
         "email": email,
         "status": status,
         "error_message": error_message,
         "timestamp": timestamp
     }
-    db.reference(f'users/{uid}/log/{timestamp}').set(log_data)
+    get_write_queue().enqueue(f'users/{uid}/log/{unique_key(now)}', log_data)
+
 
 
 
 
+def data_to_firebase(question, response, title, conversation_id):
+    from history import record_turn
+    from metrics import span
 
-def data_to_firebase(question, response, title):
     if 'user_data' in st.session_state and st.session_state['user_data']:
         user_data = st.session_state['user_data']
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%dT%H%M%S")
-        log_data = {
-            "question": question,
-            "response": response,
-            "title": title
-        }
 
         if 'uid' in user_data:
             uid = user_data['uid']
-            db.reference(f'users/{uid}/chat/{timestamp}').set(log_data)
+            with span("firebase.enqueue"):
+                record_turn(get_write_queue().enqueue, uid, conversation_id, question, response, title)
             st.success("Data logged successfully.")
         else:
             st.warning("User ID not found. Data not logged.")
     else:
         st.warning("User not logged in. Data not logged.")
 
+# Called from the title worker once the model's title is ready, so the uid is passed in
+def rename_conversation(uid, conversation_id, conversation, title):
+    from history import record_title
+
+    conversation["title"] = title
+    record_title(get_write_queue().enqueue, uid, conversation_id, title)
+
 def get_conversation_titles():
+    from history import load_conversation_index
+
     if 'user_data' in st.session_state and st.session_state['user_data']:
         user_data = st.session_state['user_data']
         uid = user_data['uid']
-        user_chat = db.reference(f'users/{uid}/chat').get()
-        
-        if user_chat:
-            titles = [entry.get('title', 'Untitled') for entry in user_chat.values()]
-            return list(set(titles))
-        
+        index = load_conversation_index(uid)
+        return list({meta.get('title', 'Untitled') for meta in index.values()})
+
     return []
 
 
 def get_recent_questions():
+    from history import load_recent_questions
+
     if 'user_data' in st.session_state and st.session_state['user_data']:
         user_data = st.session_state['user_data']
         uid = user_data['uid']
-        user_chat = db.reference(f'users/{uid}/chat').get()
-        
-        if user_chat:
-            questions = [entry.get('question', '') for entry in user_chat.values()]
-            return questions[-10:] 
-        
+        return load_recent_questions(uid, 10)
+
     return []
 
 def convert_chat_log(log_content):
@@ -165,27 +233,50 @@ def convert_chat_log(log_content):
     return result
 
 
+# Conversation metadata only; message bodies are fetched per conversation with get_conversation_messages
 def get_conversation_data(uid):
-    user_chat = db.reference(f'users/{uid}/chat').get()
-    if user_chat:
-        conversations = {}
-        for timestamp, data in user_chat.items():
-            title = data.get('title', 'Untitled')
-            if title not in conversations:
-                conversations[title] = []
-            conversations[title].append({
-                "role": "user",
-                "content": data.get('question', '')
-            })
-            conversations[title].append({
-                "role": "assistant",
-                "content": data.get('response', '')
-            })
-        return conversations
-    return {}
+    from history import load_conversation_index
+
+    return load_conversation_index(uid)
+
+def get_conversation_messages(uid, conversation_id, before=None):
+    from history import load_messages
+
+    return load_messages(uid, conversation_id, before=before)
+
+# Session conversations start as index-only stubs; bodies load when a thread is opened
+def restore_conversations(uid, prefetch=3):
+    from history import load_conversation_index, prefetch_messages
+
+    index = load_conversation_index(uid)
+    conversations = {
+        conversation_id: {
+            "title": meta.get('title', 'Untitled'),
+            "messages": [],
+            "loaded": False,
+            "cursor": None
+        }
+        for conversation_id, meta in index.items()
+    }
+    prefetch_messages(uid, list(conversations)[:prefetch])
+    return conversations
+
+def open_conversation(uid, conversation_id, conversation):
+    if conversation.get("loaded", True):
+        return
+    from history import load_messages
+
+    messages, cursor = load_messages(uid, conversation_id)
+    conversation["messages"] = messages
+    conversation["cursor"] = cursor
+    conversation["loaded"] = True
 
 def logout():
     if st.sidebar.button("Logout"):
+        from session_store import get_session_store
+
+        if "session_id" in st.session_state:
+            get_session_store().drop_session(st.session_state.session_id)
         for key in list(st.session_state.keys()):
             del st.session_state[key]
         st.success("Logged out successfully!")
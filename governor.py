@@ -0,0 +1,362 @@
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import httpx
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+from metrics import annotate
+from tokens import count_tokens
+
+# Per-provider limits, shared by every session in the process. Keep them a little under
+# the account limits so bursts queue here instead of coming back as 429s.
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "3000"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "150000"))
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "32"))
+TAVILY_RPM = int(os.getenv("TAVILY_RPM", "100"))
+TAVILY_CONCURRENCY = int(os.getenv("TAVILY_CONCURRENCY", "8"))
+# Longest a call may wait for capacity before it fails, and how often a throttled call is retried
+GOVERNOR_MAX_WAIT = float(os.getenv("GOVERNOR_MAX_WAIT", "60"))
+GOVERNOR_RETRIES = int(os.getenv("GOVERNOR_RETRIES", "4"))
+GOVERNOR_BACKOFF = float(os.getenv("GOVERNOR_BACKOFF", "0.5"))
+# Read timeouts in seconds, kept near the breaker budgets so a call the breaker has given up on
+# frees its worker soon after. Completions stream, so the OpenAI one bounds the gap between chunks.
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "20"))
+TAVILY_TIMEOUT = float(os.getenv("TAVILY_TIMEOUT", "10"))
+# Completion tokens assumed for a request that does not set max_tokens
+COMPLETION_ESTIMATE = 256
+
+# Lower runs first: interactive chat, then the news feed, then title generation
+LANES = {"chat": 0, "news": 1, "title": 2}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DURATION_PART = re.compile(r"([\d.]+)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+_lane = contextvars.ContextVar("governor_lane", default="chat")
+
+
+class RateLimited(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def lane(name):
+    # Calls made inside (including on executors fed through metrics.submit) queue in this lane
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def parse_duration(value):
+    # Rate limit headers use "20ms", "1.5s" or "6m0s"
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_delay(headers, attempt):
+    hinted = None
+    if headers.get("retry-after-ms"):
+        hinted = float(headers["retry-after-ms"]) / 1000
+    elif headers.get("retry-after"):
+        hinted = parse_duration(headers["retry-after"])
+    if hinted is None:
+        hinted = max(parse_duration(headers.get("x-ratelimit-reset-requests")) or 0,
+                     parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0) or None
+    base = hinted if hinted is not None else GOVERNOR_BACKOFF * 2 ** attempt
+    # Jitter so callers throttled together do not come back together
+    return min(base, 60) * random.uniform(1, 1.5)
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount, now):
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        return 0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, remaining, now):
+        # The provider's own count wins when it is lower than ours (other processes share the key)
+        self.refill(now)
+        self.level = min(self.level, remaining)
+
+
+class ProviderLimiter:
+    def __init__(self, name, rpm, tpm=None, concurrency=8):
+        self.name = name
+        self.concurrency = concurrency
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.in_flight = 0
+        self.blocked_until = 0
+        self.granted = {name: 0 for name in LANES}
+        self.waited_ms = {name: 0.0 for name in LANES}
+        self.throttled = 0
+        self.retries = 0
+        self.rejected = 0
+        self._waiting = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens=0, lane_name=None, timeout=GOVERNOR_MAX_WAIT):
+        lane_name = lane_name or _lane.get()
+        ticket = (LANES.get(lane_name, len(LANES)), next(self._seq))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    # Only the highest-priority waiter may take capacity, so a busy news
+                    # refresh can never starve a chat turn that arrived later
+                    if self._waiting[0] == ticket and self.in_flight < self.concurrency:
+                        wait = max(
+                            self.blocked_until - now,
+                            self.requests.delay(1, now),
+                            self.tokens.delay(tokens, now) if self.tokens else 0
+                        )
+                        if wait <= 0:
+                            heapq.heappop(self._waiting)
+                            self.requests.take(1)
+                            if self.tokens:
+                                self.tokens.take(tokens)
+                            self.in_flight += 1
+                            self.granted[lane_name] = self.granted.get(lane_name, 0) + 1
+                            self.waited_ms[lane_name] = self.waited_ms.get(lane_name, 0.0) + (now - start) * 1000
+                            self._cond.notify_all()
+                            return
+                    remaining = start + timeout - now
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise RateLimited(f"{self.name} capacity not available within {timeout:.0f}s")
+                    self._cond.wait(min(wait, remaining) if wait is not None else remaining)
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def record_retry(self):
+        with self._cond:
+            self.retries += 1
+
+    def observe(self, headers):
+        now = time.monotonic()
+        with self._cond:
+            if headers.get("x-ratelimit-remaining-requests"):
+                self.requests.sync(float(headers["x-ratelimit-remaining-requests"]), now)
+            if self.tokens and headers.get("x-ratelimit-remaining-tokens"):
+                self.tokens.sync(float(headers["x-ratelimit-remaining-tokens"]), now)
+
+    def throttle(self, delay):
+        # A 429 means the provider is already past its limit for everyone, so pause the whole provider
+        with self._cond:
+            self.throttled += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiting),
+                "granted": dict(self.granted),
+                "avg_wait_ms": {name: round(self.waited_ms[name] / count, 1) if count else 0.0 for name, count in self.granted.items()},
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "rejected": self.rejected
+            }
+
+
+def governed_call(limiter, tokens, send, status_of, headers_of, close):
+    # send() performs one attempt; retries on 429/5xx and connection errors with jittered backoff
+    for attempt in range(GOVERNOR_RETRIES + 1):
+        limiter.acquire(tokens)
+        try:
+            response = send()
+        except (httpx.TransportError, requests.ConnectionError, requests.Timeout):
+            limiter.release()
+            if attempt == GOVERNOR_RETRIES:
+                raise
+            limiter.record_retry()
+            time.sleep(retry_delay({}, attempt))
+            continue
+        except BaseException:
+            # Anything else ends the call, but must not keep the concurrency slot
+            limiter.release()
+            raise
+
+        try:
+            headers = headers_of(response)
+            limiter.observe(headers)
+            status = status_of(response)
+        except BaseException:
+            close(response)
+            limiter.release()
+            raise
+        if status not in RETRY_STATUSES or attempt == GOVERNOR_RETRIES:
+            return response
+
+        close(response)
+        limiter.release()
+        limiter.record_retry()
+        delay = retry_delay(headers, attempt)
+        annotate(**{f"{limiter.name}_retries": attempt + 1})
+        if status == 429:
+            limiter.throttle(delay)
+        else:
+            time.sleep(delay)
+
+
+def estimate_openai_tokens(body):
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        return COMPLETION_ESTIMATE
+    if "input" in payload:
+        inputs = payload["input"] if isinstance(payload["input"], list) else [payload["input"]]
+        return sum(count_tokens(item) if isinstance(item, str) else len(item) for item in inputs)
+    prompt = sum(count_tokens(message.get("content") or "") + 4 for message in payload.get("messages", []))
+    if payload.get("functions"):
+        prompt += count_tokens(json.dumps(payload["functions"]))
+    return prompt + (payload.get("max_tokens") or COMPLETION_ESTIMATE)
+
+
+class ReleasingStream(httpx.SyncByteStream):
+    # Streamed completions hold their concurrency slot until the body has been read
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+        self.released = False
+
+    def __iter__(self):
+        yield from self.stream
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            if not self.released:
+                self.released = True
+                self.release()
+
+
+class GovernedTransport(httpx.BaseTransport):
+    def __init__(self, limiter, transport):
+        self.limiter = limiter
+        self.transport = transport
+
+    def handle_request(self, request):
+        request.read()
+        response = governed_call(
+            self.limiter, estimate_openai_tokens(request.content),
+            lambda: self.transport.handle_request(request),
+            lambda response: response.status_code,
+            lambda response: response.headers,
+            lambda response: response.close()
+        )
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=ReleasingStream(response.stream, self.limiter.release),
+            extensions=response.extensions
+        )
+
+    def close(self):
+        self.transport.close()
+
+
+class GovernedAdapter(HTTPAdapter):
+    def __init__(self, limiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        # The Tavily wrapper posts without a timeout; a hung search would hold its breaker worker forever
+        kwargs["timeout"] = kwargs.get("timeout") or (5, TAVILY_TIMEOUT)
+        response = governed_call(
+            self.limiter, 0,
+            lambda: super(GovernedAdapter, self).send(request, **kwargs),
+            lambda response: response.status_code,
+            lambda response: response.headers,
+            lambda response: response.close()
+        )
+        self.limiter.release()
+        return response
+
+
+class Governor:
+    def __init__(self):
+        self.providers = {
+            "openai": ProviderLimiter("openai", OPENAI_RPM, OPENAI_TPM, OPENAI_CONCURRENCY),
+            "tavily": ProviderLimiter("tavily", TAVILY_RPM, concurrency=TAVILY_CONCURRENCY)
+        }
+
+    def stats(self):
+        return {name: limiter.stats() for name, limiter in self.providers.items()}
+
+
+@st.cache_resource(show_spinner=False)
+def get_governor():
+    return Governor()
+
+
+@st.cache_resource(show_spinner=False)
+def get_openai_http_client():
+    # One keep-alive pool for every OpenAI model and embedding client in the process
+    transport = httpx.HTTPTransport(limits=httpx.Limits(max_connections=OPENAI_CONCURRENCY, max_keepalive_connections=OPENAI_CONCURRENCY))
+    return httpx.Client(
+        transport=GovernedTransport(get_governor().providers["openai"], transport),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=5)
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def install_tavily_session():
+    # The Tavily wrapper posts through the module-level `requests`; a pooled, governed
+    # session with the same post() signature is swapped in for it
+    from langchain_community.utilities import tavily_search
+
+    session = requests.Session()
+    session.mount("https://", GovernedAdapter(
+        get_governor().providers["tavily"], pool_connections=1, pool_maxsize=TAVILY_CONCURRENCY
+    ))
+    tavily_search.requests = session
+    return session
@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_admin import db
+
+from write_behind import unique_key
+
+# Layout:
+#   users/{uid}/conversation_index/{conversation_id} -> {title, updated_at, message_count}
+#   users/{uid}/conversations/{conversation_id}/{turn_key} -> {question, response, title}
+# The sidebar only reads the index, message bodies are paged in per conversation.
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+HISTORY_INDEX_LIMIT = int(os.getenv("HISTORY_INDEX_LIMIT", "50"))
+HISTORY_CACHE_USERS = int(os.getenv("HISTORY_CACHE_USERS", "500"))
+
+
+def turns_to_messages(turns):
+    messages = []
+    for data in turns.values():
+        messages.append({"role": "user", "content": data.get('question', '')})
+        messages.append({"role": "assistant", "content": data.get('response', '')})
+    return messages
+
+
+class HistoryCache:
+    def __init__(self, max_users=HISTORY_CACHE_USERS):
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _user(self, uid):
+        entry = self._users.get(uid)
+        if entry is None:
+            entry = self._users[uid] = {"index": None, "pages": {}}
+        self._users.move_to_end(uid)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return entry
+
+    def get_index(self, uid):
+        with self._lock:
+            return self._user(uid)["index"]
+
+    def set_index(self, uid, index):
+        with self._lock:
+            self._user(uid)["index"] = index
+
+    def get_page(self, uid, conversation_id, before):
+        with self._lock:
+            return self._user(uid)["pages"].get((conversation_id, before))
+
+    def set_page(self, uid, conversation_id, before, page):
+        with self._lock:
+            self._user(uid)["pages"][(conversation_id, before)] = page
+
+    def record_turn(self, uid, conversation_id, title):
+        # Writes are queued, so cached entries are patched or dropped rather than re-read
+        with self._lock:
+            entry = self._user(uid)
+            if entry["index"] is not None:
+                meta = entry["index"].setdefault(conversation_id, {"message_count": 0})
+                meta["title"] = title
+                meta["updated_at"] = int(time.time() * 1000)
+                meta["message_count"] = meta.get("message_count", 0) + 2
+            for key in [key for key in entry["pages"] if key[0] == conversation_id]:
+                del entry["pages"][key]
+
+    def record_title(self, uid, conversation_id, title):
+        with self._lock:
+            entry = self._user(uid)
+            if entry["index"] is not None and conversation_id in entry["index"]:
+                entry["index"][conversation_id]["title"] = title
+
+    def invalidate(self, uid):
+        with self._lock:
+            self._users.pop(uid, None)
+
+
+history_cache = HistoryCache()
+prefetch_executor = ThreadPoolExecutor(max_workers=int(os.getenv("HISTORY_PREFETCH_WORKERS", "4")), thread_name_prefix="history")
+
+
+def turn_updates(uid, conversation_id, question, response, title):
+    # One multi-path update: the turn itself plus the index entry for the sidebar
+    index_path = f'users/{uid}/conversation_index/{conversation_id}'
+    return {
+        f'users/{uid}/conversations/{conversation_id}/{unique_key()}': {
+            "question": question,
+            "response": response,
+            "title": title
+        },
+        f'{index_path}/title': title,
+        f'{index_path}/updated_at': {".sv": "timestamp"},
+        f'{index_path}/message_count': {".sv": {"increment": 2}},
+    }
+
+
+def record_turn(enqueue, uid, conversation_id, question, response, title):
+    for path, value in turn_updates(uid, conversation_id, question, response, title).items():
+        enqueue(path, value)
+    history_cache.record_turn(uid, conversation_id, title)
+
+
+def record_title(enqueue, uid, conversation_id, title):
+    enqueue(f'users/{uid}/conversation_index/{conversation_id}/title', title)
+    history_cache.record_title(uid, conversation_id, title)
+
+
+def migrate_legacy_chat(uid):
+    # Older builds wrote every turn to users/{uid}/chat, grouped into conversations by title
+    legacy = db.reference(f'users/{uid}/chat').get()
+    if not legacy:
+        return {}
+
+    updates, index = {}, {}
+    for key, data in legacy.items():
+        title = data.get('title', 'Untitled')
+        conversation_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{uid}/{title}"))
+        updates[f'users/{uid}/conversations/{conversation_id}/{key}'] = data
+        meta = index.setdefault(conversation_id, {"title": title, "updated_at": 0, "message_count": 0})
+        meta["message_count"] += 2
+    now = int(time.time() * 1000)
+    for conversation_id, meta in index.items():
+        meta["updated_at"] = now
+        updates[f'users/{uid}/conversation_index/{conversation_id}'] = meta
+    db.reference('/').update(updates)
+    return index
+
+
+def load_conversation_index(uid, limit=HISTORY_INDEX_LIMIT):
+    index = history_cache.get_index(uid)
+    if index is not None:
+        return index
+
+    entries = db.reference(f'users/{uid}/conversation_index').order_by_child('updated_at').limit_to_last(limit).get()
+    if entries is None and db.reference(f'users/{uid}/chat').get(shallow=True):
+        entries = migrate_legacy_chat(uid)
+
+    index = OrderedDict(sorted((entries or {}).items(), key=lambda item: item[1].get('updated_at', 0), reverse=True))
+    history_cache.set_index(uid, index)
+    return index
+
+
+def load_messages(uid, conversation_id, limit=HISTORY_PAGE_SIZE, before=None):
+    # Returns (messages, cursor); pass cursor back as before= to page further into the past
+    page = history_cache.get_page(uid, conversation_id, before)
+    if page is not None:
+        return page
+
+    query = db.reference(f'users/{uid}/conversations/{conversation_id}').order_by_key()
+    if before is not None:
+        turns = query.end_at(before).limit_to_last(limit + 1).get() or {}
+        turns.pop(before, None)
+    else:
+        turns = query.limit_to_last(limit).get() or {}
+
+    keys = list(turns)
+    cursor = keys[0] if len(keys) >= limit else None
+    page = (turns_to_messages(turns), cursor)
+    history_cache.set_page(uid, conversation_id, before, page)
+    return page
+
+
+def load_recent_questions(uid, limit=10):
+    questions = []
+    for conversation_id in load_conversation_index(uid):
+        turns = db.reference(f'users/{uid}/conversations/{conversation_id}').order_by_key().limit_to_last(limit).get() or {}
+        questions.extend((key, turn.get('question', '')) for key, turn in turns.items())
+        if len(questions) >= limit:
+            break
+    return [question for _, question in sorted(questions)[-limit:]]
+
+
+def prefetch_messages(uid, conversation_ids, limit=HISTORY_PAGE_SIZE):
+    # Warms the page cache in the background so opening a recent thread is a cache hit
+    return [prefetch_executor.submit(load_messages, uid, conversation_id, limit) for conversation_id in conversation_ids]
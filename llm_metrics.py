@@ -0,0 +1,62 @@
+import json
+import time
+import uuid
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metrics import current_span, estimate_cost, finish_span
+from tokens import count_tokens
+
+# Kept out of metrics.py so spans can be recorded without loading langchain (the thin client)
+
+
+def generation_text(generation):
+    if generation.text:
+        return generation.text
+    # Function calls come back in additional_kwargs with empty text
+    message = getattr(generation, "message", None)
+    return json.dumps(message.additional_kwargs) if message is not None and message.additional_kwargs else ""
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    # Attached to the shared chat model, records one span per LLM call.
+    # Streaming responses carry no usage block, so tokens are counted locally.
+    def __init__(self):
+        self._runs = {}
+
+    def _start(self, run_id, model, prompt_text):
+        parent = current_span()
+        self._runs[run_id] = ({
+            "stage": f"llm:{parent['stage']}" if parent else "llm",
+            "span_id": uuid.uuid4().hex[:12],
+            "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex[:12],
+            "parent_id": parent["span_id"] if parent else None,
+            "model": model,
+            "prompt_tokens": count_tokens(prompt_text),
+        }, time.perf_counter())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        model = (kwargs.get("invocation_params") or {}).get("model_name") or (kwargs.get("invocation_params") or {}).get("model", "")
+        prompt_text = "\n".join(str(message.content) for batch in messages for message in batch)
+        self._start(run_id, model, prompt_text)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        model = (kwargs.get("invocation_params") or {}).get("model_name", "")
+        self._start(run_id, model, "\n".join(prompts))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        entry = self._runs.pop(run_id, None)
+        if entry is None:
+            return
+        record, start = entry
+        completion = "".join(generation_text(generation) for generations in response.generations for generation in generations)
+        record["completion_tokens"] = count_tokens(completion)
+        record["cost"] = estimate_cost(record["model"], record["prompt_tokens"], record["completion_tokens"])
+        finish_span(record, start)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        entry = self._runs.pop(run_id, None)
+        if entry is not None:
+            record, start = entry
+            record["error"] = True
+            finish_span(record, start)
@@ -0,0 +1,150 @@
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+METRICS_LOG = os.getenv("METRICS_LOG", "1") == "1"
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1000"))
+
+# USD per million tokens as (prompt, completion)
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4o-mini": (0.15, 0.6),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+
+logger = logging.getLogger("chat.metrics")
+if METRICS_LOG and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    prompt_price, completion_price = MODEL_PRICES.get(model, MODEL_PRICES["gpt-3.5-turbo"])
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # Nearest-rank percentile
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class MetricsRegistry:
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._durations = defaultdict(lambda: deque(maxlen=self.window))
+        self._totals = defaultdict(lambda: defaultdict(float))
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        stage = span["stage"]
+        with self._lock:
+            self._durations[stage].append(span["ms"])
+            totals = self._totals[stage]
+            totals["count"] += 1
+            totals["errors"] += 1 if span.get("error") else 0
+            totals["prompt_tokens"] += span.get("prompt_tokens", 0)
+            totals["completion_tokens"] += span.get("completion_tokens", 0)
+            totals["cost"] += span.get("cost", 0.0)
+            if "cache" in span:
+                totals["cache_hits" if span["cache"] == "hit" else "cache_misses"] += 1
+            for key, value in span.items():
+                # Stage-specific counters, e.g. prompt_tokens_saved from content compaction
+                if key.endswith("_saved") and isinstance(value, (int, float)):
+                    totals[key] += value
+
+    def summary(self):
+        with self._lock:
+            stages = {stage: (list(durations), dict(self._totals[stage])) for stage, durations in self._durations.items()}
+        rows = []
+        for stage, (durations, totals) in sorted(stages.items()):
+            lookups = totals.get("cache_hits", 0) + totals.get("cache_misses", 0)
+            row = {
+                "stage": stage,
+                "count": int(totals.get("count", 0)),
+                "p50_ms": round(percentile(durations, 0.5), 1),
+                "p95_ms": round(percentile(durations, 0.95), 1),
+                "errors": int(totals.get("errors", 0)),
+                "prompt_tokens": int(totals.get("prompt_tokens", 0)),
+                "completion_tokens": int(totals.get("completion_tokens", 0)),
+                "cost_usd": round(totals.get("cost", 0.0), 6),
+                "cache_hit_rate": round(totals.get("cache_hits", 0) / lookups, 3) if lookups else None,
+            }
+            row.update({key: int(value) for key, value in totals.items() if key.endswith("_saved")})
+            rows.append(row)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._totals.clear()
+
+
+registry = MetricsRegistry()
+
+
+def finish_span(record, start):
+    record["ms"] = round((time.perf_counter() - start) * 1000, 2)
+    registry.record(record)
+    if METRICS_LOG:
+        logger.info(json.dumps(record, default=str))
+
+
+@contextmanager
+def span(stage, **attributes):
+    parent = _current_span.get()
+    record = {
+        "stage": stage,
+        "span_id": uuid.uuid4().hex[:12],
+        "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex[:12],
+        "parent_id": parent["span_id"] if parent else None,
+        **attributes
+    }
+    token = _current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record["error"] = True
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # A generator closed from another context, its span still gets recorded
+            pass
+        finish_span(record, start)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def annotate(**attributes):
+    record = _current_span.get()
+    if record is not None:
+        record.update(attributes)
+
+
+def bind_context(fn):
+    # Worker threads start with an empty context; carry the caller's span across
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def submit(executor, fn, *args, **kwargs):
+    return executor.submit(bind_context(fn), *args, **kwargs)
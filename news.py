@@ -0,0 +1,290 @@
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytz
+import streamlit as st
+from langchain_community.tools.tavily_search import TavilySearchResults
+
+from cassette import record_request
+from compaction import NEWS_SOURCE_TOKEN_BUDGET, compact_results
+from governor import lane
+from metrics import annotate, span, submit
+from news_schema import parse_articles, parse_date, result_date
+from resources import get_llm
+
+NEWS_TTL = float(os.getenv("NEWS_TTL", "900"))
+NEWS_SEARCH_TTL = float(os.getenv("NEWS_SEARCH_TTL", "900"))
+NEWS_CACHE_SIZE = int(os.getenv("NEWS_CACHE_SIZE", "1000"))
+# "fanout" searches each interest and skill on its own so overlapping profiles share slices
+NEWS_SEARCH_MODE = os.getenv("NEWS_SEARCH_MODE", "combined")
+NEWS_REFRESH_INTERVAL = float(os.getenv("NEWS_REFRESH_INTERVAL", "300"))
+NEWS_REFRESH_TOP = int(os.getenv("NEWS_REFRESH_TOP", "10"))
+# Only profiles requested within this many seconds are kept warm; idle ones are forgotten
+NEWS_REFRESH_WINDOW = float(os.getenv("NEWS_REFRESH_WINDOW", "3600"))
+NEWS_PROFILES_MAX = int(os.getenv("NEWS_PROFILES_MAX", "1000"))
+NEWS_MAX_RESULTS = 20
+NEWS_MAX_AGE = timedelta(days=7)
+
+NEWS_DOMAINS = ["bbc.com", "cnn.com", "reuters.com", "apnews.com", "bloomberg.com", "nytimes.com", "wsj.com"]
+
+
+class TTLCache:
+    def __init__(self, ttl, max_entries=NEWS_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def expires_in(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] + self.ttl - time.time() if entry else 0
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def clean_terms(terms):
+    return tuple(sorted({term.strip().lower() for term in terms if term and term.strip()}))
+
+
+def news_key(user_data, current_date):
+    return clean_terms(user_data['interests']), clean_terms(user_data['skills']), current_date
+
+
+def search_news(query, max_results=NEWS_MAX_RESULTS):
+    return TavilySearchResults(
+        max_results=max_results,
+        include_domains=NEWS_DOMAINS,
+        exclude_domains=["wikipedia.org"],
+        time_range="d"  # d for past day
+    ).invoke(query)
+
+
+def recent(date, current_time, max_age=NEWS_MAX_AGE):
+    # Undated items are kept, the model or the reader can still judge them
+    return date is None or current_time - date <= max_age
+
+
+def format_results(search_results, dates):
+    return "\n\n".join(
+        f"[{i}] {result.get('url', '')}\n"
+        + (f"Published: {date:%Y-%m-%d %H:%M:%S} UTC\n" if date else "")
+        + result.get('content', '')
+        for i, (result, date) in enumerate(zip(search_results, dates), 1)
+    )
+
+
+def rank_articles(search_results, interests, skills, current_date, num_articles=10):
+    current_time = datetime.now(pytz.utc)
+    if isinstance(search_results, list):
+        # Drop stale results before they cost prompt tokens
+        search_results = [result for result in search_results if recent(result_date(result), current_time)]
+    else:
+        search_results = []
+    if not search_results:
+        return []
+    # Dates are read before compaction, which may drop the sentence they came from
+    dates = [result_date(result) for result in search_results]
+    # Only the sentences about the user's topics go into the prompt
+    search_results = compact_results(search_results, f"{interests} {skills}", NEWS_SOURCE_TOKEN_BUDGET)
+
+    prompt = f"""
+    Based on these search results, identify the 10 most recent and relevant news articles related to the user's interests ({interests}) and skills ({skills}).
+    Today's date is {current_date}. Only include articles from the past week, prioritizing the most recent ones.
+    For each article, provide:
+    1. A concise title (max 15 words)
+    2. A brief summary (2-3 sentences)
+    3. The source URL
+    4. The exact publication date and time (if available, in UTC)
+    5. The source name
+
+    Respond with a JSON object with an "articles" key holding a list of objects, each containing "title", "summary", "url", "date", and "source" keys.
+    Ensure the "date" field is in the format 'YYYY-MM-DD HH:MM:SS UTC' if available, or 'YYYY-MM-DD' if only the date is known.
+    If the exact date is not available, use 'Recent' as the date value.
+
+    Sort the articles by date, with the most recent first.
+
+    Search results:
+    {format_results(search_results, dates)}
+    """
+
+    response = get_llm().bind(response_format={"type": "json_object"}).invoke(prompt)
+    articles = parse_articles(response.content)
+
+    filtered_articles = [article for article in articles if recent(parse_date(article['date']), current_time)]
+    return filtered_articles[:num_articles]
+
+
+class NewsService:
+    def __init__(self, search_mode=NEWS_SEARCH_MODE):
+        self.search_mode = search_mode
+        self.search_cache = TTLCache(NEWS_SEARCH_TTL)
+        self.ranked_cache = TTLCache(NEWS_TTL)
+        self.popularity = Counter()
+        # profile -> (num_articles, last requested), least recently requested first
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        # (key, num_articles) -> Future of the build in progress
+        self._building = {}
+        self._executor = ThreadPoolExecutor(max_workers=int(os.getenv("NEWS_WORKERS", "6")), thread_name_prefix="news")
+        self._refresher = None
+
+    def cached_search(self, query, max_results=NEWS_MAX_RESULTS):
+        key = (query, max_results)
+        with span("news.search") as record:
+            results = self.search_cache.get(key)
+            record["cache"] = "miss" if results is None else "hit"
+            if results is None:
+                results = search_news(query, max_results)
+                # Error strings are not cached so the next refresh retries
+                if isinstance(results, list):
+                    self.search_cache.set(key, results)
+            return results
+
+    def fetch_results(self, interests, skills, current_date):
+        if self.search_mode != "fanout":
+            query = f"latest news as of {current_date} related to {', '.join(interests)} and {', '.join(skills)}"
+            return self.cached_search(query)
+
+        topics = list(dict.fromkeys(interests + skills))
+        per_topic = max(5, NEWS_MAX_RESULTS // max(len(topics), 1))
+        futures = [
+            submit(self._executor, self.cached_search, f"latest news as of {current_date} related to {topic}", per_topic)
+            for topic in topics
+        ]
+
+        merged, seen_urls = [], set()
+        for future in futures:
+            results = future.result()
+            if not isinstance(results, list):
+                continue
+            for result in results:
+                url = result.get('url')
+                if url in seen_urls:
+                    continue
+                seen_urls.add(url)
+                merged.append(result)
+        return merged
+
+    def build(self, key, num_articles):
+        # Concurrent misses for the same profile (and the refresher) share one search and ranking
+        with self._lock:
+            future = self._building.get((key, num_articles))
+            leader = future is None
+            if leader:
+                future = self._building[(key, num_articles)] = Future()
+        if not leader:
+            annotate(shared=True)
+            return future.result()
+
+        try:
+            articles = self.search_and_rank(key, num_articles)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(articles)
+        finally:
+            with self._lock:
+                del self._building[(key, num_articles)]
+        return articles
+
+    def search_and_rank(self, key, num_articles):
+        interests, skills, current_date = key
+        search_results = self.fetch_results(list(interests), list(skills), current_date)
+        with span("news.rank", results=len(search_results) if isinstance(search_results, list) else 0):
+            articles = rank_articles(search_results, ", ".join(interests), ", ".join(skills), current_date, num_articles)
+        # An empty ranking is not cached so the next refresh tries again
+        if articles:
+            self.ranked_cache.set((key, num_articles), articles)
+        return articles
+
+    def get_news(self, user_data, num_articles=10):
+        key = news_key(user_data, datetime.now(pytz.utc).strftime("%Y-%m-%d"))
+        with self._lock:
+            self.popularity[key[:2]] += 1
+            self._profiles[key[:2]] = (num_articles, time.time())
+            self._profiles.move_to_end(key[:2])
+            while len(self._profiles) > NEWS_PROFILES_MAX:
+                profile, _ = self._profiles.popitem(last=False)
+                del self.popularity[profile]
+
+        with span("news"), lane("news"):
+            articles = self.ranked_cache.get((key, num_articles))
+            annotate(cache="miss" if articles is None else "hit")
+            if articles is None:
+                articles = self.build(key, num_articles)
+            return list(articles)
+
+    def refresh_popular(self):
+        current_date = datetime.now(pytz.utc).strftime("%Y-%m-%d")
+        cutoff = time.time() - NEWS_REFRESH_WINDOW
+        with self._lock:
+            while self._profiles:
+                profile, (_, last_requested) = next(iter(self._profiles.items()))
+                if last_requested >= cutoff:
+                    break
+                del self._profiles[profile]
+                del self.popularity[profile]
+            popular = [(profile, self._profiles[profile][0]) for profile, _ in self.popularity.most_common(NEWS_REFRESH_TOP)]
+
+        for (interests, skills), num_articles in popular:
+            key = (interests, skills, current_date)
+            # Rebuild anything that would expire before the next pass
+            if self.ranked_cache.expires_in((key, num_articles)) <= NEWS_REFRESH_INTERVAL:
+                try:
+                    with span("news.refresh"), lane("news"):
+                        self.build(key, num_articles)
+                except Exception:
+                    continue
+
+    def start_refresher(self, interval=NEWS_REFRESH_INTERVAL):
+        if self._refresher is not None or interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.refresh_popular()
+
+        self._refresher = threading.Thread(target=run, daemon=True, name="news-refresher")
+        self._refresher.start()
+
+
+@st.cache_resource(show_spinner=False)
+def get_news_service():
+    service = NewsService()
+    service.start_refresher()
+    return service
+
+
+def get_recent_news(user_data, num_articles=10):
+    start = time.perf_counter()
+    articles = get_news_service().get_news(user_data, num_articles)
+    record_request("news", {
+        "user_data": {"interests": user_data['interests'], "skills": user_data['skills']},
+        "num_articles": num_articles
+    }, time.perf_counter() - start)
+    return articles
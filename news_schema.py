@@ -0,0 +1,107 @@
+import ast
+import json
+import re
+from datetime import datetime
+from typing import TypedDict
+from urllib.parse import urlparse
+
+import pytz
+
+
+class NewsArticle(TypedDict):
+    title: str
+    summary: str
+    url: str
+    date: str
+    source: str
+
+
+ARTICLE_FIELDS = ("title", "summary", "url", "date", "source")
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S UTC", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d")
+URL_DATE = re.compile(r"/(20\d{2})[/-](\d{1,2})[/-](\d{1,2})(?:/|-|$)")
+TEXT_DATE = re.compile(r"\b(20\d{2})-(\d{2})-(\d{2})\b")
+FLAT_OBJECT = re.compile(r"\{[^{}]*\}")
+
+
+def parse_date(value):
+    if not isinstance(value, str) or not value.strip() or value.strip() == "Recent":
+        return None
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return pytz.utc.localize(datetime.strptime(value, date_format))
+        except ValueError:
+            continue
+    match = TEXT_DATE.search(value)
+    return date_from_match(match)
+
+
+def date_from_match(match):
+    if match is None:
+        return None
+    try:
+        return pytz.utc.localize(datetime(*(int(part) for part in match.groups())))
+    except ValueError:
+        return None
+
+
+def result_date(result):
+    # Tavily only sometimes returns published_date, otherwise look for a date in the URL or text
+    published = parse_date(result.get('published_date'))
+    if published is not None:
+        return published
+    return date_from_match(URL_DATE.search(result.get('url', ''))) or date_from_match(TEXT_DATE.search(result.get('content', '')[:300]))
+
+
+def validate_article(item):
+    if not isinstance(item, dict):
+        return None
+    title, url = item.get('title'), item.get('url')
+    if not isinstance(title, str) or not title.strip() or not isinstance(url, str) or not url.startswith("http"):
+        return None
+
+    date = item.get('date')
+    date = date.strip() if isinstance(date, str) and date.strip() else "Recent"
+    source = item.get('source')
+    if not isinstance(source, str) or not source.strip():
+        source = urlparse(url).netloc
+
+    return NewsArticle(
+        title=title.strip(),
+        summary=str(item.get('summary') or "").strip(),
+        url=url.strip(),
+        date=date,
+        source=source.strip()
+    )
+
+
+def load_literal(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(text)
+    # TypeError covers literals Python cannot build, such as a list used as a dict key
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def parse_articles(text):
+    # Accepts {"articles": [...]}, a bare list, or a truncated/malformed list, keeping every valid item
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`").split("\n", 1)[-1]
+
+    data = load_literal(text)
+    if isinstance(data, dict):
+        data = data.get('articles', [data])
+    if not isinstance(data, list):
+        data = [load_literal(match.group(0)) for match in FLAT_OBJECT.finditer(text)]
+
+    articles = []
+    for item in data:
+        article = validate_article(item)
+        if article is not None:
+            articles.append(article)
+    return articles
@@ -0,0 +1,313 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import messages_to_dict
+
+from breakers import get_breaker, is_degraded, track_degradation
+from cassette import record_request
+from compaction import compact_results
+from fast_path import AnswerStream, choose_mode, is_follow_up, synthesize
+from metrics import annotate, bind_context, span, submit
+from resources import get_chain, get_tools, run_search
+from response_cache import get_response_cache
+from search_store import SearchResultStore
+from summarizer import MAX_SOURCES, format_search_results, iter_summaries, summarize_search_results
+from summary_store import get_summary_store, summary_key
+
+PENDING_SUMMARY = "_Summarizing..._"
+# Start the fallback search alongside the agent instead of after it, at the cost of
+# a Tavily call that is thrown away whenever the agent searches by itself
+SPECULATIVE_SEARCH = os.getenv("SPECULATIVE_SEARCH", "0") == "1"
+
+
+@st.cache_resource(show_spinner=False)
+def get_search_executor():
+    return ThreadPoolExecutor(max_workers=int(os.getenv("SEARCH_WORKERS", "4")), thread_name_prefix="search")
+
+
+class TokenCallbackHandler(BaseCallbackHandler):
+    def __init__(self, on_token):
+        self.on_token = on_token
+
+    def on_llm_new_token(self, token, **kwargs):
+        # Function-call deltas arrive as empty tokens, only answer text is forwarded
+        if token:
+            self.on_token(token)
+
+
+def run_agent(prompt, search_store, on_token=None, chat_history=None):
+    config = {"callbacks": [TokenCallbackHandler(on_token)]} if on_token else {}
+    with span("agent", history_messages=len(chat_history or [])):
+        return get_chain().invoke({
+            "input": prompt,
+            "chat_history": chat_history or [],
+            "intermediate_steps": [],
+            "search_store": search_store
+        }, config=config)
+
+
+def agent_answer(response):
+    return response['agent_outcome'].return_values['output']
+
+
+def search_tool():
+    return get_tools()[0]
+
+
+def start_speculative_search(prompt):
+    if not SPECULATIVE_SEARCH:
+        return None
+    return submit(get_search_executor(), guarded_search, prompt)
+
+
+def guarded_search(prompt):
+    # An open search breaker means the answer goes out without sources
+    return get_breaker("search").call(run_search, search_tool(), prompt, fallback=list)
+
+
+def search_results_for(search_store, prompt, speculative=None):
+    # Reuse what the agent already found, searching only if it answered without the tool.
+    # A failed or refused agent search is not retried here, so a slow Tavily costs one budget per turn.
+    if search_store.searched:
+        if speculative is not None:
+            speculative.cancel()
+        return search_store.results()
+
+    with span("search", source="speculative" if speculative is not None else "fallback"):
+        search_results = speculative.result() if speculative is not None else guarded_search(prompt)
+    return search_results if isinstance(search_results, list) else []
+
+
+def compose_response(answer, formatted_results, overall_summary):
+    return f"{answer}\n\n{formatted_results}\nOverall Summary:\n{overall_summary}"
+
+
+def cached_response(prompt, scope):
+    if scope is None:
+        return None
+    cached = get_response_cache().get(prompt, scope)
+    annotate(cache="hit" if cached else "miss")
+    return cached
+
+
+def shared_scope(scope, chat_history):
+    # Standalone questions in a conversation may be served from the cache, but an answer written
+    # with this user's history in the prompt is never stored for others with the same profile
+    return None if chat_history else scope
+
+
+def cache_response(prompt, scope, answer, formatted_results, overall_summary):
+    # Degraded answers are served once but never cached
+    if scope is not None and not is_degraded():
+        get_response_cache().set(prompt, {
+            "answer": answer,
+            "formatted_results": formatted_results,
+            "overall_summary": overall_summary
+        }, scope)
+
+
+def record_chat(prompt, scope, chat_history, streaming, start, mode=None):
+    record_request("chat", {
+        "prompt": prompt,
+        "scope": scope,
+        "chat_history": messages_to_dict(chat_history or []),
+        "streaming": streaming,
+        "mode": mode
+    }, time.perf_counter() - start)
+
+
+# scope is the response cache partition (see response_cache.cache_scope), None disables caching.
+# chat_history comes from context.conversation_history; follow-ups depend on it so they skip the cache.
+# mode is "agent", "fast" or "auto" (see fast_path.choose_mode), None uses PIPELINE_MODE.
+def run_chat(prompt, scope=None, chat_history=None, mode=None):
+    start = time.perf_counter()
+    response = chat_response(prompt, scope, chat_history, mode)
+    record_chat(prompt, scope, chat_history, False, start, mode)
+    return response
+
+
+def chat_response(prompt, scope, chat_history, mode=None):
+    with span("chat", streaming=False) as record, track_degradation() as degraded:
+        response = build_chat_response(prompt, scope, chat_history, mode)
+        if degraded:
+            record["degraded"] = sorted(degraded)
+        return response
+
+
+def build_chat_response(prompt, scope, chat_history, mode=None):
+    if is_follow_up(prompt, chat_history):
+        scope = None
+    cached = cached_response(prompt, scope)
+    if cached:
+        return compose_response(cached["answer"], cached["formatted_results"], cached["overall_summary"])
+    scope = shared_scope(scope, chat_history)
+
+    mode = choose_mode(prompt, chat_history, mode)
+    annotate(mode=mode)
+    if mode == "fast":
+        for kind, payload in fast_chat_events(prompt, scope, chat_history):
+            if kind == "final":
+                return payload
+
+    search_store = SearchResultStore()
+    speculative = start_speculative_search(prompt)
+    response = run_agent(prompt, search_store, chat_history=chat_history)
+    search_results = search_results_for(search_store, prompt, speculative)
+    with span("summarize", sources=len(search_results[:MAX_SOURCES])):
+        formatted_results, overall_summary = summarize_search_results(search_results, query=prompt)
+    answer = agent_answer(response)
+    cache_response(prompt, scope, answer, formatted_results, overall_summary)
+    return compose_response(answer, formatted_results, overall_summary)
+
+
+def stream_chat(prompt, scope=None, chat_history=None, mode=None):
+    # Yields ("token", text), ("answer", text), ("sources", partial markdown),
+    # ("overall", text) and finally ("final", full response text)
+    with span("chat", streaming=True) as record, track_degradation() as degraded:
+        start = time.perf_counter()
+        for event in stream_chat_events(prompt, scope, chat_history, mode):
+            if "ttft_ms" not in record:
+                record["ttft_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            yield event
+        if degraded:
+            record["degraded"] = sorted(degraded)
+    record_chat(prompt, scope, chat_history, True, start, mode)
+
+
+def stream_chat_events(prompt, scope, chat_history, mode=None):
+    if is_follow_up(prompt, chat_history):
+        scope = None
+    cached = cached_response(prompt, scope)
+    if cached:
+        yield "answer", cached["answer"]
+        yield "sources", cached["formatted_results"]
+        yield "overall", cached["overall_summary"]
+        yield "final", compose_response(cached["answer"], cached["formatted_results"], cached["overall_summary"])
+        return
+    scope = shared_scope(scope, chat_history)
+
+    mode = choose_mode(prompt, chat_history, mode)
+    annotate(mode=mode)
+    if mode == "fast":
+        yield from fast_chat_events(prompt, scope, chat_history)
+        return
+
+    events = queue.Queue()
+    search_store = SearchResultStore()
+    speculative = start_speculative_search(prompt)
+
+    def run():
+        try:
+            events.put(("agent", run_agent(
+                prompt, search_store,
+                on_token=lambda token: events.put(("token", token)),
+                chat_history=chat_history
+            )))
+        except Exception as e:
+            events.put(("error", e))
+
+    threading.Thread(target=bind_context(run), daemon=True, name="agent-stream").start()
+
+    while True:
+        kind, payload = events.get()
+        if kind == "token":
+            yield "token", payload
+        elif kind == "error":
+            if speculative is not None:
+                speculative.cancel()
+            raise payload
+        else:
+            response = payload
+            break
+
+    answer = agent_answer(response)
+    yield "answer", answer
+    yield from summary_events(prompt, scope, answer, search_results_for(search_store, prompt, speculative))
+
+
+def summary_events(prompt, scope, answer, search_results):
+    if not isinstance(search_results, list):
+        search_results = []
+    if not search_results:
+        formatted_results, overall_summary = summarize_search_results(search_results)
+        yield "sources", formatted_results
+        yield "overall", overall_summary
+        cache_response(prompt, scope, answer, formatted_results, overall_summary)
+        yield "final", compose_response(answer, formatted_results, overall_summary)
+        return
+
+    summaries = [PENDING_SUMMARY] * len(search_results[:MAX_SOURCES])
+    yield "sources", format_search_results(search_results, summaries)
+
+    overall_summary = None
+    with span("summarize", sources=len(summaries)):
+        for kind, index, summary in iter_summaries(search_results, query=prompt):
+            if kind == "source":
+                summaries[index] = summary
+                yield "sources", format_search_results(search_results, summaries)
+            else:
+                overall_summary = summary
+                yield "overall", overall_summary
+
+    formatted_results = format_search_results(search_results, summaries)
+    cache_response(prompt, scope, answer, formatted_results, overall_summary)
+    yield "final", compose_response(answer, formatted_results, overall_summary)
+
+
+def fast_chat_events(prompt, scope, chat_history):
+    # Search once, then answer and summarize in a single LLM call; same events as the agent path
+    with span("search", source="fast"):
+        search_results = guarded_search(prompt)
+    if not isinstance(search_results, list):
+        search_results = []
+    sources = search_results[:MAX_SOURCES]
+
+    events = queue.Queue()
+
+    def run():
+        try:
+            stream = AnswerStream(lambda token: events.put(("token", token)))
+            result = synthesize(prompt, compact_results(sources, prompt), chat_history, callbacks=[TokenCallbackHandler(stream.feed)])
+            stream.flush()
+            events.put(("done", result))
+        except Exception as e:
+            events.put(("error", e))
+
+    threading.Thread(target=bind_context(run), daemon=True, name="fast-stream").start()
+
+    while True:
+        kind, payload = events.get()
+        if kind == "token":
+            yield "token", payload
+        elif kind == "error":
+            raise payload
+        else:
+            answer, summaries, overall_summary = payload
+            break
+
+    yield "answer", answer
+    if not sources or summaries is None:
+        # No structured part to use, summarize the usual way
+        yield from summary_events(prompt, scope, answer, search_results)
+        return
+
+    # Sources summarized before keep their stored summary so every user sees the same one
+    store = get_summary_store()
+    for i, result in enumerate(sources):
+        key = summary_key(result)
+        stored = store.get(key)
+        if stored is None:
+            store.set(key, result.get('url'), summaries[i])
+        else:
+            summaries[i] = stored
+
+    formatted_results = format_search_results(search_results, summaries)
+    yield "sources", formatted_results
+    yield "overall", overall_summary
+    cache_response(prompt, scope, answer, formatted_results, overall_summary)
+    yield "final", compose_response(answer, formatted_results, overall_summary)
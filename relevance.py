@@ -0,0 +1,171 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+from breakers import get_breaker
+from metrics import annotate, span
+from resources import get_llm
+from response_cache import normalize_query
+
+# Optional embedding tier between the keyword match and the LLM fallback
+RELEVANCE_EMBEDDINGS = os.getenv("RELEVANCE_EMBEDDINGS", "0") == "1"
+RELEVANCE_ACCEPT = float(os.getenv("RELEVANCE_ACCEPT", "0.45"))
+RELEVANCE_REJECT = float(os.getenv("RELEVANCE_REJECT", "0.2"))
+RELEVANCE_MEMO_SIZE = int(os.getenv("RELEVANCE_MEMO_SIZE", "20000"))
+
+# Function words would match any query against profiles like "Internet of Things"; two-letter
+# words not listed here are kept for acronyms such as AI, HR or ML
+STOPWORDS = {
+    "a", "about", "after", "all", "also", "an", "and", "any", "are", "as", "at", "be", "been", "before",
+    "best", "but", "by", "can", "could", "do", "does", "for", "from", "get", "had", "has", "have", "how",
+    "if", "in", "into", "is", "it", "its", "latest", "me", "more", "most", "my", "new", "no", "not", "of",
+    "on", "or", "other", "our", "out", "over", "should", "so", "some", "tell", "than", "that", "the",
+    "their", "them", "then", "there", "these", "they", "this", "those", "to", "up", "us", "was", "we",
+    "were", "what", "when", "where", "which", "while", "who", "why", "will", "with", "would", "you", "your",
+}
+
+
+def stem(word):
+    for suffix in ("ations", "ation", "ings", "ing", "ers", "er", "ies", "es", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def keywords(text):
+    return {
+        stem(word) for word in re.findall(r"[a-z0-9]+", text.lower())
+        if len(word) >= 2 and word not in STOPWORDS and not word.isdigit()
+    }
+
+
+def profile_key(user_data):
+    fields = [
+        (user_data.get('department') or "").strip().lower(),
+        ",".join(sorted(i.strip().lower() for i in user_data.get('interests', []))),
+        ",".join(sorted(s.strip().lower() for s in user_data.get('skills', []))),
+    ]
+    return hashlib.sha1("|".join(fields).encode("utf-8")).hexdigest()
+
+
+class ProfileIndex:
+    def __init__(self, user_data, embed_documents=None):
+        terms = [user_data.get('department') or ""] + list(user_data.get('interests', [])) + list(user_data.get('skills', []))
+        self.terms = [term.strip() for term in terms if term and term.strip()]
+        self.keywords = set().union(*(keywords(term) for term in self.terms)) if self.terms else set()
+        # Five-letter prefixes catch word forms the suffix stemmer misses (advertising / advertisements)
+        self.prefixes = {word[:5] for word in self.keywords if len(word) >= 5}
+        self.vectors = None
+        if embed_documents is not None and self.terms:
+            vectors = np.asarray(embed_documents(self.terms), dtype=np.float32)
+            self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def keyword_match(self, query):
+        query_keywords = keywords(query)
+        if query_keywords & self.keywords:
+            return True
+        return any(word[:5] in self.prefixes for word in query_keywords if len(word) >= 5)
+
+    def similarity(self, query_vector):
+        vector = np.asarray(query_vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        return float(np.max(self.vectors @ vector))
+
+
+class RelevanceClassifier:
+    def __init__(self, embeddings=None, memo_size=RELEVANCE_MEMO_SIZE):
+        self.embeddings = embeddings
+        self.memo_size = memo_size
+        self._profiles = {}
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memo": 0, "keyword": 0, "embedding": 0, "llm": 0, "degraded": 0}
+
+    def profile(self, user_data):
+        key = profile_key(user_data)
+        with self._lock:
+            index = self._profiles.get(key)
+        if index is None:
+            embed_documents = self.embeddings.embed_documents if self.embeddings is not None else None
+            index = ProfileIndex(user_data, embed_documents)
+            with self._lock:
+                self._profiles[key] = index
+        return key, index
+
+    def _remember(self, memo_key, decision, tier):
+        annotate(tier=tier, relevant=decision)
+        with self._lock:
+            self.stats[tier] += 1
+            self._memo[memo_key] = decision
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return decision
+
+    def is_relevant(self, query, user_data):
+        key, index = self.profile(user_data)
+        memo_key = (key, normalize_query(query))
+        with self._lock:
+            if memo_key in self._memo:
+                self._memo.move_to_end(memo_key)
+                self.stats["memo"] += 1
+                annotate(tier="memo", cache="hit")
+                return self._memo[memo_key]
+
+        if index.keyword_match(query):
+            return self._remember(memo_key, True, "keyword")
+
+        breaker = get_breaker("relevance")
+        if index.vectors is not None:
+            vector = breaker.call(self.embeddings.embed_query, query, fallback=lambda: None)
+            if vector is not None:
+                score = index.similarity(vector)
+                if score >= RELEVANCE_ACCEPT:
+                    return self._remember(memo_key, True, "embedding")
+                if score < RELEVANCE_REJECT:
+                    return self._remember(memo_key, False, "embedding")
+
+        # Only ambiguous queries pay for a model round-trip
+        decision = breaker.call(llm_relevance, query, user_data, fallback=lambda: None)
+        if decision is None:
+            # With the model unavailable the gate lets the query through, and the guess is not memoized
+            annotate(tier="degraded", relevant=True)
+            with self._lock:
+                self.stats["degraded"] += 1
+            return True
+        return self._remember(memo_key, decision, "llm")
+
+
+def llm_relevance(query, user_data):
+    prompt = f"""
+    Given the user's department: {user_data['department']}
+    and interests: {', '.join(user_data['interests'])},
+    is the following query relevant? Query: {query}
+    Respond with 'Yes' or 'No'.
+    """
+    response = get_llm().predict(prompt)
+    return response.strip().lower().rstrip('.') == 'yes'
+
+
+@st.cache_resource(show_spinner=False)
+def get_relevance_classifier():
+    embeddings = None
+    if RELEVANCE_EMBEDDINGS:
+        from langchain_openai import OpenAIEmbeddings
+        from governor import get_openai_http_client
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-small", max_retries=0, http_client=get_openai_http_client())
+    return RelevanceClassifier(embeddings)
+
+
+def prepare_profile(user_data):
+    # Called at login so the first query finds the profile index already built
+    get_relevance_classifier().profile(user_data)
+
+
+def is_relevant_query(query, user_data):
+    with span("relevance"):
+        return get_relevance_classifier().is_relevant(query, user_data)
@@ -0,0 +1,125 @@
+import json
+import os
+
+import streamlit as st
+from langchain.agents import create_openai_functions_agent
+from langchain_openai.chat_models import ChatOpenAI
+from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.agents import AgentFinish
+from langgraph.graph import END, Graph
+
+from breakers import DependencyUnavailable, get_breaker
+from cassette import install as install_cassette
+from governor import get_openai_http_client, install_tavily_session
+from llm_metrics import LLMMetricsHandler
+from metrics import span
+
+# Local copy of hwchase17/openai-functions-agent so startup never hits the prompt hub
+AGENT_PROMPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts", "openai_functions_agent.json")
+# Tool observation while the search breaker is open, so the agent still answers
+SEARCH_UNAVAILABLE = "Web search is temporarily unavailable. Answer from what you already know and mention that no sources could be checked."
+
+
+def load_agent_prompt(path=AGENT_PROMPT_PATH):
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+
+    messages = []
+    for message in spec["messages"]:
+        if message["type"] == "placeholder":
+            messages.append(MessagesPlaceholder(
+                variable_name=message["variable_name"],
+                optional=message.get("optional", False)
+            ))
+        else:
+            messages.append((message["type"], message["template"]))
+    return ChatPromptTemplate.from_messages(messages)
+
+
+# CASSETTE_MODE=record|replay routes every LLM and Tavily call through the cassette store
+install_cassette()
+# Tavily calls share one pooled, rate-limited session (see governor.py)
+install_tavily_session()
+
+
+# Everything below is built once per process and shared by all sessions and reruns
+@st.cache_resource(show_spinner=False)
+def get_llm():
+    # streaming=True lets per-request callbacks receive answer tokens as they arrive
+    # The metrics handler records latency, tokens and cost for every call on this model
+    # Retries are left to the governor's shared client, which also queues calls under the rate limits
+    return ChatOpenAI(
+        model="gpt-3.5-turbo", streaming=True, callbacks=[LLMMetricsHandler()],
+        max_retries=0, http_client=get_openai_http_client()
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def get_tools():
+    return [TavilySearchResults(max_results=5)]
+
+
+@st.cache_resource(show_spinner=False)
+def get_agent_prompt():
+    return load_agent_prompt()
+
+
+def run_search(tool, tool_input):
+    # TavilySearchResults returns repr(e) instead of raising, which the breaker would count as a success
+    observation = tool.invoke(tool_input)
+    if not isinstance(observation, list):
+        raise DependencyUnavailable(f"{tool.name} failed: {observation}")
+    return observation
+
+
+def execute_tools(data):
+    agent_action = data.pop('agent_outcome')
+    tools_to_use = {t.name: t for t in get_tools()}[agent_action.tool]
+    with span(f"tool:{agent_action.tool}"):
+        observation = get_breaker("search").call(run_search, tools_to_use, agent_action.tool_input, fallback=lambda: SEARCH_UNAVAILABLE)
+    data['intermediate_steps'].append((agent_action, observation))
+    if data.get('search_store') is not None:
+        data['search_store'].add(observation)
+    return data
+
+
+def should_continue(data):
+    if isinstance(data['agent_outcome'], AgentFinish):
+        return "exit"
+    else:
+        return "continue"
+
+
+@st.cache_resource(show_spinner=False)
+def get_chain():
+    agent_runnable = create_openai_functions_agent(get_llm(), get_tools(), get_agent_prompt())
+
+    agent = RunnablePassthrough.assign(
+        agent_outcome=agent_runnable
+    )
+
+    workflow = Graph()
+    workflow.add_node("agent", agent)
+    workflow.add_node("tools", execute_tools)
+    workflow.set_entry_point("agent")
+    workflow.add_conditional_edges(
+        "agent",
+        should_continue,
+        {
+            "continue": "tools",
+            "exit": END
+        }
+    )
+    workflow.add_edge('tools', 'agent')
+
+    return workflow.compile()
+
+
+def warm_up():
+    # Build every shared resource up front so the first chat turn pays no construction cost
+    get_llm()
+    get_tools()
+    get_agent_prompt()
+    get_chain()
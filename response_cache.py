@@ -0,0 +1,144 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "21600"))
+# The embedding tier is off unless enabled, exact and normalized matching never call a model
+RESPONSE_CACHE_EMBEDDINGS = os.getenv("RESPONSE_CACHE_EMBEDDINGS", "0") == "1"
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.93"))
+
+FILLER_WORDS = {"a", "an", "the", "please", "can", "you", "could", "tell", "me", "about", "what", "is", "are", "whats"}
+
+
+def normalize_query(query):
+    words = re.findall(r"[a-z0-9]+", query.lower().replace("'", ""))
+    return " ".join(word for word in words if word not in FILLER_WORDS)
+
+
+def cache_scope(user_data):
+    # Answers are only shared between users with the same department and interests
+    department = (user_data.get('department') or "").strip().lower()
+    interests = sorted({interest.strip().lower() for interest in user_data.get('interests', []) if interest.strip()})
+    return f"{department}|{','.join(interests)}"
+
+
+class InMemoryVectorIndex:
+    def __init__(self):
+        self._keys = []
+        self._vectors = []
+
+    def add(self, key, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        self._keys.append(key)
+        self._vectors.append(vector / norm if norm else vector)
+
+    def remove(self, key):
+        if key in self._keys:
+            i = self._keys.index(key)
+            del self._keys[i]
+            del self._vectors[i]
+
+    def search(self, vector):
+        if not self._vectors:
+            return None, 0.0
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        scores = np.stack(self._vectors) @ (vector / norm if norm else vector)
+        best = int(np.argmax(scores))
+        return self._keys[best], float(scores[best])
+
+
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL,
+                 embed=None, index_factory=InMemoryVectorIndex, similarity=RESPONSE_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed = embed
+        self.index_factory = index_factory
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "normalized_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0}
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        index = self._indexes.get(key[0])
+        if index is not None:
+            index.remove(key)
+
+    def _live_entry(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry["created"] > self.ttl:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, query, scope=""):
+        key = (scope, normalize_query(query))
+        now = time.time()
+        with self._lock:
+            entry = self._live_entry(key, now)
+            if entry is not None:
+                self.stats["exact_hits" if entry["query"] == query else "normalized_hits"] += 1
+                return entry["value"]
+            index = self._indexes.get(scope)
+
+        if self.embed is not None and index is not None:
+            vector = self.embed(query)
+            with self._lock:
+                match, score = index.search(vector)
+                entry = self._live_entry(match, now) if match and score >= self.similarity else None
+                if entry is not None:
+                    self.stats["semantic_hits"] += 1
+                    return entry["value"]
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, query, value, scope=""):
+        key = (scope, normalize_query(query))
+        vector = self.embed(query) if self.embed is not None else None
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = {"query": query, "value": value, "created": time.time()}
+            if vector is not None:
+                self._indexes.setdefault(scope, self.index_factory()).add(key, vector)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._indexes.clear()
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["normalized_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (lookups - stats["misses"]) / lookups if lookups else 0.0
+        return stats
+
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    embed = None
+    if RESPONSE_CACHE_EMBEDDINGS:
+        from langchain_openai import OpenAIEmbeddings
+        from governor import get_openai_http_client
+        embed = OpenAIEmbeddings(model="text-embedding-3-small", max_retries=0, http_client=get_openai_http_client()).embed_query
+    return ResponseCache(embed=embed)
@@ -0,0 +1,35 @@
+import threading
+
+
+# Collects every search observation produced while answering one request
+class SearchResultStore:
+    def __init__(self):
+        self._results = []
+        self._urls = set()
+        self._lock = threading.Lock()
+        # Set once the agent has searched, even if the search failed or the breaker refused it
+        self.searched = False
+
+    def add(self, observation):
+        self.searched = True
+        # Tavily returns an error string instead of a list when a search fails
+        if not isinstance(observation, list):
+            return
+        with self._lock:
+            for result in observation:
+                if not isinstance(result, dict):
+                    continue
+                url = result.get('url')
+                if url and url in self._urls:
+                    continue
+                if url:
+                    self._urls.add(url)
+                self._results.append(result)
+
+    def results(self):
+        with self._lock:
+            return list(self._results)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._results)
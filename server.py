@@ -0,0 +1,357 @@
+import asyncio
+import contextlib
+import functools
+import json
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from dotenv import load_dotenv
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+# The app modules read their settings at import time
+load_dotenv()
+
+from breakers import breaker_stats
+from context import conversation_history
+from governor import get_governor
+from metrics import bind_context, registry
+from news import NEWS_MAX_RESULTS, get_recent_news
+from pipeline import run_chat, stream_chat
+from relevance import get_relevance_classifier, is_relevant_query
+from resources import warm_up
+from response_cache import get_response_cache
+from summary_store import get_summary_store
+from titles import conversation_title
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+# The pipeline is blocking, so every request holds one worker thread until it finishes
+API_WORKERS = int(os.getenv("API_WORKERS", "8"))
+# Requests allowed to wait for a worker; past that the server answers 503 so the
+# load balancer can try another instance instead of queueing without bound
+API_QUEUE = int(os.getenv("API_QUEUE", "32"))
+API_QUEUE_TIMEOUT = float(os.getenv("API_QUEUE_TIMEOUT", "30"))
+# How long shutdown waits for in-flight requests before they are cancelled
+API_SHUTDOWN_TIMEOUT = float(os.getenv("API_SHUTDOWN_TIMEOUT", "60"))
+# After SIGTERM the listener stays open this long with /healthz at 503, so load balancers
+# notice and stop routing here before connections start being refused
+API_DRAIN_GRACE = float(os.getenv("API_DRAIN_GRACE", "10"))
+
+STREAM_DONE = object()
+
+
+def overloaded(reason):
+    return web.HTTPServiceUnavailable(
+        text=json.dumps({"error": reason}),
+        content_type="application/json",
+        headers={"Retry-After": "1"}
+    )
+
+
+class WorkerPool:
+    def __init__(self, workers=API_WORKERS, queue_size=API_QUEUE, queue_timeout=API_QUEUE_TIMEOUT):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.queue_timeout = queue_timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self.admitted = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.draining = False
+        self._slots = None
+        self._idle = None
+
+    async def start(self):
+        self._slots = asyncio.Semaphore(self.workers)
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        if self.draining:
+            self.rejected += 1
+            raise overloaded("shutting down")
+        if self.admitted >= self.capacity:
+            self.rejected += 1
+            raise overloaded("too many requests queued")
+
+        self.admitted += 1
+        self._idle.clear()
+        try:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise overloaded("timed out waiting for a worker")
+            self.running += 1
+            try:
+                yield
+            finally:
+                self.running -= 1
+                self.completed += 1
+                self._slots.release()
+        finally:
+            self.admitted -= 1
+            if not self.admitted:
+                self._idle.set()
+
+    def run(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, bind_context(functools.partial(fn, *args)))
+
+    async def drain(self, timeout):
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.executor.shutdown(wait=False)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "running": self.running,
+            "queued": self.admitted - self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "draining": self.draining
+        }
+
+
+async def read_body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise bad_request("body must be JSON")
+    if not isinstance(body, dict):
+        raise bad_request("body must be a JSON object")
+    return body
+
+
+def bad_request(error):
+    return web.HTTPBadRequest(text=json.dumps({"error": error}), content_type="application/json")
+
+
+def required(body, field, kind):
+    value = body.get(field)
+    if not isinstance(value, kind):
+        raise bad_request(f"'{field}' is required")
+    return value
+
+
+def parse_chat_history(value):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise bad_request("'chat_history' must be a list of messages")
+    try:
+        return messages_from_dict(value)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise bad_request("'chat_history' must be a list of messages as produced by messages_to_dict")
+
+
+def parse_user_data(value):
+    if not isinstance(value, dict):
+        raise bad_request("'user_data' is required")
+    for field in ("interests", "skills"):
+        terms = value.get(field)
+        if not isinstance(terms, list) or not all(isinstance(term, str) for term in terms):
+            raise bad_request("'user_data' needs interests and skills lists of strings")
+    department = value.get("department")
+    if department is not None and not isinstance(department, str):
+        raise bad_request("'department' must be a string")
+    return {"department": department, "interests": value["interests"], "skills": value["skills"]}
+
+
+def parse_conversation(body):
+    messages = body.get("messages")
+    if not isinstance(messages, list) or not all(
+        isinstance(message, dict) and message.get("role") in ("user", "assistant") and isinstance(message.get("content"), str)
+        for message in messages
+    ):
+        raise bad_request("'messages' must be a list of user and assistant messages")
+    state = body.get("context")
+    if state is None:
+        return {"messages": messages}
+    if not isinstance(state, dict) or not isinstance(state.get("summary"), str) or not isinstance(state.get("folded"), int) or state["folded"] < 0:
+        raise bad_request("'context' must have a summary string and a folded count")
+    return {"messages": messages, "context": {"summary": state["summary"], "folded": state["folded"]}}
+
+
+def parse_num_articles(value):
+    if value is None:
+        return 10
+    try:
+        num_articles = int(value)
+    except (TypeError, ValueError):
+        raise bad_request("'num_articles' must be a number")
+    if isinstance(value, bool) or not 1 <= num_articles <= NEWS_MAX_RESULTS:
+        raise bad_request(f"'num_articles' must be between 1 and {NEWS_MAX_RESULTS}")
+    return num_articles
+
+
+async def stream_events(request, pool, events):
+    # Runs the blocking generator on a worker thread and writes each event as one NDJSON line
+    loop = asyncio.get_running_loop()
+    outbox = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def produce():
+        try:
+            for kind, payload in events():
+                if cancelled.is_set():
+                    break
+                loop.call_soon_threadsafe(outbox.put_nowait, {"event": kind, "data": payload})
+        except Exception as e:
+            loop.call_soon_threadsafe(outbox.put_nowait, {"event": "error", "data": str(e)})
+        finally:
+            loop.call_soon_threadsafe(outbox.put_nowait, STREAM_DONE)
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    worker = pool.run(produce)
+    try:
+        while True:
+            event = await outbox.get()
+            if event is STREAM_DONE:
+                break
+            await response.write((json.dumps(event) + "\n").encode("utf-8"))
+    finally:
+        # Client went away or shutdown cancelled us: stop the generator at its next event
+        cancelled.set()
+        await asyncio.shield(worker)
+    await response.write_eof()
+    return response
+
+
+async def chat(request):
+    body = await read_body(request)
+    prompt = required(body, "prompt", str)
+    scope = body.get("scope")
+    if scope is not None and not isinstance(scope, str):
+        raise bad_request("'scope' must be a string")
+    chat_history = parse_chat_history(body.get("chat_history"))
+    mode = body.get("mode")
+    if mode not in (None, "agent", "fast", "auto"):
+        raise bad_request("'mode' must be agent, fast or auto")
+    pool = request.app["pool"]
+
+    async with pool.slot():
+        if body.get("stream"):
+            return await stream_events(request, pool, lambda: stream_chat(prompt, scope=scope, chat_history=chat_history, mode=mode))
+        response = await pool.run(run_chat, prompt, scope, chat_history, mode)
+    return web.json_response({"response": response})
+
+
+async def news(request):
+    body = await read_body(request)
+    user_data = parse_user_data(body.get("user_data"))
+    num_articles = parse_num_articles(body.get("num_articles"))
+
+    async with request.app["pool"].slot():
+        articles = await request.app["pool"].run(get_recent_news, user_data, num_articles)
+    return web.json_response({"articles": articles})
+
+
+async def relevance(request):
+    body = await read_body(request)
+    prompt = required(body, "prompt", str)
+    user_data = parse_user_data(body.get("user_data"))
+
+    async with request.app["pool"].slot():
+        relevant = await request.app["pool"].run(is_relevant_query, prompt, user_data)
+    return web.json_response({"relevant": relevant})
+
+
+async def title(request):
+    body = await read_body(request)
+    conversation_id = required(body, "conversation_id", str)
+    message = required(body, "message", str)
+
+    async with request.app["pool"].slot():
+        title = await request.app["pool"].run(conversation_title, conversation_id, [{"role": "user", "content": message}])
+    return web.json_response({"title": title})
+
+
+async def context(request):
+    # Rolling summary for a thin client: the client keeps the returned state on its conversation
+    # and sends it back with the next turn
+    conversation = parse_conversation(await read_body(request))
+
+    async with request.app["pool"].slot():
+        chat_history = await request.app["pool"].run(conversation_history, conversation)
+    return web.json_response({"chat_history": messages_to_dict(chat_history), "context": conversation["context"]})
+
+
+async def health(request):
+    pool = request.app["pool"]
+    # Load balancers stop routing here as soon as shutdown starts
+    return web.json_response(pool.stats(), status=503 if pool.draining else 200)
+
+
+async def metrics(request):
+    return web.json_response({
+        "pool": request.app["pool"].stats(),
+        "stages": registry.summary(),
+        "response_cache": get_response_cache().snapshot(),
+        "summary_store": get_summary_store().snapshot(),
+        "relevance": get_relevance_classifier().stats,
+        "rate_limits": get_governor().stats(),
+        "breakers": breaker_stats()
+    })
+
+
+async def on_startup(app):
+    await app["pool"].start()
+    # Build the chain and tools before the first request instead of on it
+    await app["pool"].run(warm_up)
+
+
+async def on_shutdown(app):
+    # Already drained when serve() got a signal; this covers other ways of stopping the app
+    await app["pool"].drain(API_SHUTDOWN_TIMEOUT)
+
+
+def create_app(pool=None):
+    app = web.Application()
+    app["pool"] = pool or WorkerPool()
+    app.router.add_post("/chat", chat)
+    app.router.add_post("/news", news)
+    app.router.add_post("/relevance", relevance)
+    app.router.add_post("/title", title)
+    app.router.add_post("/context", context)
+    app.router.add_get("/healthz", health)
+    app.router.add_get("/metrics", metrics)
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+
+async def serve(app, host=API_HOST, port=API_PORT, grace=API_DRAIN_GRACE):
+    # web.run_app closes the listener before on_shutdown runs, so a load balancer could never
+    # see /healthz turn 503; here draining starts on the signal while the site keeps listening
+    runner = web.AppRunner(app, shutdown_timeout=API_SHUTDOWN_TIMEOUT)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Serving on http://{host}:{port}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        await stop.wait()
+        pool = app["pool"]
+        pool.draining = True
+        await asyncio.sleep(grace)
+        await pool.drain(API_SHUTDOWN_TIMEOUT)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(create_app()))
@@ -0,0 +1,160 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import streamlit as st
+
+# st.session_state keeps only the latest messages of each conversation; older ones are spilled
+# here and paged back in by "Load earlier messages". An empty path spills to an in-memory database.
+SESSION_SPILL_PATH = os.getenv("SESSION_SPILL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".session_spill.db"))
+SESSION_SPILL_TTL = float(os.getenv("SESSION_SPILL_TTL", str(24 * 3600)))
+SESSION_RESIDENT_MESSAGES = int(os.getenv("SESSION_RESIDENT_MESSAGES", "40"))
+# Conversations the user has switched away from keep enough for the verbatim context window
+SESSION_IDLE_MESSAGES = int(os.getenv("SESSION_IDLE_MESSAGES", "8"))
+SESSION_STATS_TTL = float(os.getenv("SESSION_STATS_TTL", "3600"))
+CHAT_RENDER_WINDOW = int(os.getenv("CHAT_RENDER_WINDOW", "20"))
+
+
+def message_bytes(message):
+    return sys.getsizeof(message) + sum(sys.getsizeof(value) for value in message.values())
+
+
+def shift_context(conversation, count):
+    # context["folded"] indexes into conversation["messages"], so it moves with the front of the list
+    state = conversation.get("context")
+    if state is not None:
+        state["folded"] += count
+
+
+def spillable(conversation, keep):
+    # Turns the rolling summary has not absorbed yet stay resident, otherwise the agent would
+    # never see them; without a context state nothing has been summarized to fall out of step with
+    count = len(conversation["messages"]) - keep
+    state = conversation.get("context")
+    if state is not None:
+        count = min(count, state["folded"])
+    return count - count % 2
+
+
+def prepend_messages(conversation, messages):
+    conversation["messages"][:0] = messages
+    conversation["first_seq"] = conversation.get("first_seq", 0) - len(messages)
+    shift_context(conversation, len(messages))
+
+
+class SessionStore:
+    def __init__(self, path=SESSION_SPILL_PATH, ttl=SESSION_SPILL_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.stats = {"spilled": 0, "restored": 0, "paged": 0, "evicted": 0}
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        if path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS spill (session TEXT, conversation TEXT, seq INTEGER, role TEXT, content TEXT, created REAL, "
+            "PRIMARY KEY (session, conversation, seq))"
+        )
+        self._db.execute("DELETE FROM spill WHERE created < ?", (time.time() - ttl,))
+        self._db.commit()
+
+    def spill(self, session_id, conversation_id, conversation, keep=SESSION_RESIDENT_MESSAGES):
+        # Moves the oldest messages out of the session, whole turns at a time
+        messages = conversation["messages"]
+        count = spillable(conversation, keep)
+        if count <= 0:
+            return 0
+
+        first = conversation.get("first_seq", 0)
+        now = time.time()
+        rows = [(session_id, conversation_id, first + i, message["role"], message["content"], now) for i, message in enumerate(messages[:count])]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO spill (session, conversation, seq, role, content, created) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+            self.stats["spilled"] += count
+        del messages[:count]
+        conversation["first_seq"] = first + count
+        conversation["spilled"] = conversation.get("spilled", 0) + count
+        shift_context(conversation, -count)
+        return count
+
+    def restore(self, session_id, conversation_id, conversation, count):
+        # Pulls back the newest spilled messages, i.e. the ones just before the resident list
+        if count <= 0 or not conversation.get("spilled"):
+            return 0
+        first = conversation.get("first_seq", 0)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, role, content FROM spill WHERE session = ? AND conversation = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (session_id, conversation_id, first, count),
+            ).fetchall()
+            if rows:
+                self._db.execute("DELETE FROM spill WHERE session = ? AND conversation = ? AND seq >= ? AND seq < ?", (session_id, conversation_id, rows[-1][0], first))
+                self._db.commit()
+            self.stats["restored"] += len(rows)
+
+        prepend_messages(conversation, [{"role": role, "content": content} for _, role, content in reversed(rows)])
+        # Fewer rows than asked for means the spill is exhausted (or expired)
+        conversation["spilled"] = conversation["spilled"] - len(rows) if len(rows) == count else 0
+        return len(rows)
+
+    def load_earlier(self, session_id, conversation_id, conversation, count, fetch_page=None):
+        # Spilled messages come first; once they run out, page further back with the history cursor
+        loaded = self.restore(session_id, conversation_id, conversation, count)
+        if loaded < count and fetch_page is not None and conversation.get("cursor"):
+            messages, cursor = fetch_page(conversation["cursor"])
+            prepend_messages(conversation, messages)
+            conversation["cursor"] = cursor
+            loaded += len(messages)
+            with self._lock:
+                self.stats["paged"] += len(messages)
+        return loaded
+
+    def evict(self, session_id, conversations, current_id, keep=SESSION_IDLE_MESSAGES):
+        for conversation_id, conversation in conversations.items():
+            if conversation_id != current_id and self.spill(session_id, conversation_id, conversation, keep):
+                with self._lock:
+                    self.stats["evicted"] += 1
+
+    def drop_session(self, session_id):
+        with self._lock:
+            self._db.execute("DELETE FROM spill WHERE session = ?", (session_id,))
+            self._db.commit()
+            self._sessions.pop(session_id, None)
+
+    def account(self, session_id, conversations):
+        # Per-session footprint of st.session_state.conversations, refreshed on every rerun
+        entry = {
+            "conversations": len(conversations),
+            "resident_messages": sum(len(conversation["messages"]) for conversation in conversations.values()),
+            "resident_bytes": sum(message_bytes(message) for conversation in conversations.values() for message in conversation["messages"]),
+            "spilled_messages": sum(conversation.get("spilled", 0) for conversation in conversations.values()),
+            "updated": time.time(),
+        }
+        with self._lock:
+            self._sessions[session_id] = entry
+            for stale in [key for key, value in self._sessions.items() if entry["updated"] - value["updated"] > SESSION_STATS_TTL]:
+                del self._sessions[stale]
+        return entry
+
+    def snapshot(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            stats = dict(self.stats)
+            stats["spill_rows"] = self._db.execute("SELECT COUNT(*) FROM spill").fetchone()[0]
+        sizes = sorted(session["resident_bytes"] for session in sessions)
+        stats["sessions"] = len(sessions)
+        stats["resident_messages"] = sum(session["resident_messages"] for session in sessions)
+        stats["resident_bytes"] = sum(sizes)
+        stats["spilled_messages"] = sum(session["spilled_messages"] for session in sessions)
+        stats["mean_session_bytes"] = stats["resident_bytes"] / len(sizes) if sizes else 0.0
+        stats["p95_session_bytes"] = sizes[int(0.95 * (len(sizes) - 1))] if sizes else 0
+        stats["max_session_bytes"] = sizes[-1] if sizes else 0
+        return stats
+
+
+@st.cache_resource(show_spinner=False)
+def get_session_store():
+    return SessionStore()
@@ -0,0 +1,126 @@
+import argparse
+import importlib
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+import streamlit as st
+
+# STARTUP_PROFILE=1 shows first-paint and warm-up timings in the sidebar and logs them
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") == "1"
+PROCESS_START = time.perf_counter()
+
+# Everything the chat and news features need, imported off the script thread after the
+# login form is up. Each module is timed on its own, so the first ones carry the shared
+# langchain cost.
+AI_MODULES = ["resources", "pipeline", "news", "titles", "relevance", "context", "response_cache", "governor", "breakers"]
+CLIENT_MODULES = ["api_client", "response_cache"]
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+logger = logging.getLogger("chat.startup")
+
+
+class WarmUp:
+    def __init__(self, steps):
+        self.steps = steps
+        self.timings = []
+        self.error = None
+        self.done = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            for name, step in self.steps:
+                step_start = time.perf_counter()
+                step()
+                self.timings.append((name, round((time.perf_counter() - step_start) * 1000, 1)))
+        except Exception as e:
+            # Surfaced when a feature waits on the warm-up, the login page keeps working
+            self.error = e
+        finally:
+            self.timings.append(("total", round((time.perf_counter() - start) * 1000, 1)))
+            self.done.set()
+            if STARTUP_PROFILE:
+                logger.warning(json.dumps({"startup": dict(self.timings), "error": str(self.error) if self.error else None}))
+
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+
+    def report(self):
+        return [{"step": name, "ms": ms} for name, ms in self.timings]
+
+
+def import_step(module):
+    return f"import {module}", lambda: importlib.import_module(module)
+
+
+def init_firebase_step():
+    from firebase_auth import init_firebase
+
+    init_firebase()
+
+
+def build_chain_step():
+    from resources import warm_up
+
+    warm_up()
+
+
+@st.cache_resource(show_spinner=False)
+def start_warm_up(client_mode=False):
+    # One background warm-up per process; every session after the first finds it done
+    steps = [import_step("firebase_admin"), ("init firebase", init_firebase_step), import_step("history")]
+    steps += [import_step(module) for module in (CLIENT_MODULES if client_mode else AI_MODULES)]
+    if not client_mode:
+        steps.append(("build chain", build_chain_step))
+    warm_up = WarmUp(steps)
+    threading.Thread(target=warm_up.run, daemon=True, name="warm-up").start()
+    return warm_up
+
+
+def since_process_start():
+    return round((time.perf_counter() - PROCESS_START) * 1000, 1)
+
+
+def profile_imports(modules, top=25):
+    # Cumulative import time per module, from a fresh interpreter so nothing is cached
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(f"import {module}" for module in modules)],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append({"module": name, "depth": len(indent) // 2, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    rows.sort(key=lambda row: -row["cumulative_ms"])
+    return rows[:top], result.returncode
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report import-time costs of the app modules")
+    parser.add_argument("modules", nargs="*", default=["firebase_auth", "history"] + AI_MODULES)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", action="store_true", help="print the rows as JSON")
+    args = parser.parse_args(argv)
+
+    rows, returncode = profile_imports(args.modules, args.top)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"{'module':<60}{'cumulative_ms':>15}{'self_ms':>10}")
+        for row in rows:
+            print(f"{'  ' * row['depth'] + row['module']:<60}{row['cumulative_ms']:>15.1f}{row['self_ms']:>10.1f}")
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
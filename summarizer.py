@@ -0,0 +1,201 @@
+import json
+import os
+import re
+from concurrent.futures import TimeoutError as FutureTimeoutError, as_completed
+
+from breakers import DependencyUnavailable, get_breaker
+from compaction import compact_results
+from metrics import annotate
+from resources import get_llm
+from summary_store import get_summary_store, summary_key
+
+# "concurrent" fans the per-source and overall summaries out over the summarizer breaker's pool,
+# "batched" asks for all of them in a single structured LLM call
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "concurrent")
+SUMMARY_TIMEOUT = float(os.getenv("SUMMARY_TIMEOUT", "20"))
+MAX_SOURCES = 5
+
+
+def fallback_summary(content, max_sentences=3):
+    sentences = re.split(r"(?<=[.!?])\s+", (content or "").strip())
+    return " ".join(sentences[:max_sentences]) or "No summary available."
+
+
+def generate_three_line_summary(content):
+    summary_prompt = f"Provide a three-line summary of the following content:\n\n{content}\n\nSummary:"
+    summary = get_llm().predict(summary_prompt)
+    return summary.strip()
+
+
+def generate_overall_summary(results):
+    if not results:
+        return "No information available to summarize."
+
+    combined_content = " ".join([result.get('content', '') for result in results[:MAX_SOURCES]])
+    summary_prompt = f"Provide a concise overall summary of the following information:\n\n{combined_content}\n\nSummary:"
+    summary = get_llm().predict(summary_prompt)
+    return summary
+
+
+def stored_summaries(keys):
+    # Sources summarized before, by any user, never reach the LLM
+    store = get_summary_store()
+    cached = {i: summary for i, summary in ((i, store.get(key)) for i, key in enumerate(keys)) if summary is not None}
+    annotate(summaries_cached=len(cached))
+    return cached
+
+
+def iter_concurrent_summaries(results, timeout=SUMMARY_TIMEOUT, keys=None, cached=None):
+    # Yields ("source", index, summary) and ("overall", None, summary) in completion order.
+    # keys are the summary store keys of the uncompacted results, when results were compacted;
+    # cached is what stored_summaries already found for them.
+    results = results[:MAX_SOURCES]
+    keys = keys or [summary_key(result) for result in results]
+    store = get_summary_store()
+    if cached is None:
+        cached = stored_summaries(keys)
+
+    # Calls go straight onto the summarizer breaker's pool; once it is open (or out of workers)
+    # they fail at once and the source gets the extractive fallback instead of waiting
+    breaker = get_breaker("summarizer")
+    calls = [(i, generate_three_line_summary, result.get('content', 'No content available')) for i, result in enumerate(results) if i not in cached]
+    calls.append((None, generate_overall_summary, results))
+    futures, unavailable = {}, []
+    for index, fn, arg in calls:
+        try:
+            futures[breaker.submit(fn, arg)] = index
+        except DependencyUnavailable:
+            unavailable.append(index)
+
+    for i, summary in cached.items():
+        yield "source", i, summary
+
+    def fallback(index):
+        if index is None:
+            return " ".join(fallback_summary(result.get('content', ''), 1) for result in results)
+        return fallback_summary(results[index].get('content', ''))
+
+    for index in unavailable:
+        yield "overall" if index is None else "source", index, fallback(index)
+
+    # All calls start at once, so a single deadline gives each one the same budget
+    pending = set(futures)
+    try:
+        for future in as_completed(futures, timeout=min(timeout, breaker.budget)):
+            pending.discard(future)
+            index = futures[future]
+            try:
+                summary = future.result()
+            except Exception:
+                summary = fallback(index)
+            else:
+                # Fallbacks are not stored, so the source gets a real summary next time
+                if index is not None:
+                    store.set(keys[index], results[index].get('url'), summary)
+            yield "overall" if index is None else "source", index, summary
+    except FutureTimeoutError:
+        for future in pending:
+            breaker.abandon(future)
+            index = futures[future]
+            yield "overall" if index is None else "source", index, fallback(index)
+
+
+def collect_summaries(events, count):
+    summaries = [None] * count
+    overall_summary = None
+    for kind, index, summary in events:
+        if kind == "source":
+            summaries[index] = summary
+        else:
+            overall_summary = summary
+    return summaries, overall_summary
+
+
+def summarize_concurrently(results, timeout=SUMMARY_TIMEOUT):
+    return collect_summaries(iter_concurrent_summaries(results, timeout), len(results[:MAX_SOURCES]))
+
+
+def summarize_batched(results, indices=None):
+    # indices picks the sources that need their own summary; the overall summary covers all of them
+    results = results[:MAX_SOURCES]
+    indices = list(range(len(results))) if indices is None else indices
+    sources = "\n\n".join(
+        f"Source {i}:\n{result.get('content', 'No content available')}"
+        for i, result in enumerate(results, 1)
+    )
+    numbers = ", ".join(str(i + 1) for i in indices)
+    prompt = f"""
+    Summarize sources {numbers} below in three lines each, then write a concise overall summary of all {len(results)} sources.
+    Respond with a JSON object with two keys: "summaries", a list of {len(indices)} strings for sources {numbers} in that order, and "overall", a string.
+
+    {sources}
+    """
+    response = get_llm().bind(response_format={"type": "json_object"}).invoke(prompt)
+    data = json.loads(response.content)
+
+    summaries = [str(summary).strip() for summary in data.get("summaries", [])]
+    if len(summaries) != len(indices) or not data.get("overall"):
+        raise ValueError("Batched summary response did not match the number of sources")
+    return summaries, data["overall"]
+
+
+def iter_summaries(results, mode=None, query=None):
+    # Summaries read a compacted copy; callers keep the original results for titles and URLs.
+    # Stored summaries stay keyed on the original text so every query can reuse them.
+    keys = [summary_key(result) for result in results[:MAX_SOURCES]]
+    results = compact_results(results[:MAX_SOURCES], query)
+    cached = stored_summaries(keys)
+    misses = [i for i in range(len(results)) if i not in cached]
+    # With every source already stored only the overall summary is left, which the concurrent path does alone
+    if (mode or SUMMARY_MODE) == "batched" and misses:
+        try:
+            summaries, overall_summary = get_breaker("summarizer").call(summarize_batched, results, misses)
+        except Exception:
+            # Malformed structured output falls back to one call per source
+            pass
+        else:
+            # Stored summaries are kept as they are so every user sees the same one
+            store = get_summary_store()
+            for i, summary in cached.items():
+                yield "source", i, summary
+            for i, summary in zip(misses, summaries):
+                store.set(keys[i], results[i].get('url'), summary)
+                yield "source", i, summary
+            yield "overall", None, overall_summary
+            return
+    yield from iter_concurrent_summaries(results, keys=keys, cached=cached)
+
+
+def summarize_results(results, mode=None, query=None):
+    return collect_summaries(iter_summaries(results, mode, query), len(results[:MAX_SOURCES]))
+
+
+# Function to format search results
+def format_search_results(results, summaries=None):
+    if not results:
+        return "No search results found."
+
+    if summaries is None:
+        summaries, _ = summarize_concurrently(results)
+
+    formatted_results = "Top 5 Sources:\n\n"
+    for i, (result, summary) in enumerate(zip(results[:MAX_SOURCES], summaries), 1):
+        title = result.get('title')
+        url = result.get('url', 'No URL available')
+
+        if title:
+            formatted_results += f"{i}. [{title}]({url})\n"
+        else:
+            formatted_results += f"{i}. [Reference {i}]({url})\n"
+
+        formatted_results += f"   {summary}\n\n"
+
+    return formatted_results
+
+
+def summarize_search_results(results, mode=None, query=None):
+    if not results:
+        return format_search_results(results), generate_overall_summary(results)
+
+    summaries, overall_summary = summarize_results(results, mode, query)
+    return format_search_results(results, summaries), overall_summary
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+
+# Per-source summaries are shared by every user and survive restarts; an empty path keeps them in memory only
+SUMMARY_STORE_PATH = os.getenv("SUMMARY_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".summary_store.db"))
+SUMMARY_STORE_TTL = float(os.getenv("SUMMARY_STORE_TTL", str(7 * 24 * 3600)))
+SUMMARY_STORE_SIZE = int(os.getenv("SUMMARY_STORE_SIZE", "5000"))
+
+
+def summary_key(result):
+    # Same page with the same text gives the same key, whichever query surfaced it;
+    # an edited page hashes differently and is summarized again
+    url = result.get('url') or ""
+    content = result.get('content') or ""
+    return hashlib.sha256(f"{url}\x00{content}".encode("utf-8")).hexdigest()
+
+
+class SummaryStore:
+    def __init__(self, path=SUMMARY_STORE_PATH, ttl=SUMMARY_STORE_TTL, max_entries=SUMMARY_STORE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "expired": 0}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, url TEXT, summary TEXT, created REAL)")
+            self._db.execute("DELETE FROM summaries WHERE created < ?", (time.time() - ttl,))
+            self._db.commit()
+
+    def _remember(self, key, created, summary):
+        self._entries[key] = (created, summary)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self.stats["expired"] += 1
+
+            row = None
+            if self._db is not None:
+                row = self._db.execute("SELECT created, summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[0] <= self.ttl:
+                self._remember(key, row[0], row[1])
+                self.stats["disk_hits"] += 1
+                return row[1]
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key, url, summary):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, summary)
+            self.stats["writes"] += 1
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO summaries (key, url, summary, created) VALUES (?, ?, ?, ?)", (key, url, summary, now))
+                self._db.commit()
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._entries)
+            stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM summaries").fetchone()[0] if self._db is not None else 0
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["memory_hit_rate"] = stats["memory_hits"] / lookups if lookups else 0.0
+        return stats
+
+
+@st.cache_resource(show_spinner=False)
+def get_summary_store():
+    return SummaryStore()
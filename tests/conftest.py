@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The app modules are flat files at the repository root and read their settings at import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("METRICS_LOG", "0")
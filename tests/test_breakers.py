@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+from breakers import CLOSED, OPEN, CircuitBreaker, DependencyUnavailable
+
+
+def test_submit_records_outcomes_before_the_future_resolves():
+    breaker = CircuitBreaker("test", budget=1, failure_threshold=2)
+    assert breaker.submit(lambda x: x + 1, 1).result() == 2
+    assert breaker.stats["calls"] == 1 and breaker.failures == 0
+
+    def fail():
+        raise ValueError("boom")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            breaker.submit(fail).result()
+    assert breaker.state == OPEN
+    with pytest.raises(DependencyUnavailable):
+        breaker.submit(fail)
+    assert breaker.stats["rejected"] == 1
+
+
+def test_abandoned_call_counts_once_and_frees_its_worker():
+    breaker = CircuitBreaker("test", budget=0.05, failure_threshold=5, workers=1)
+    release = threading.Event()
+    future = breaker.submit(release.wait)
+    # The only worker is busy, so the next call is turned away instead of queueing
+    with pytest.raises(DependencyUnavailable):
+        breaker.submit(lambda: None)
+    assert breaker.stats["saturated"] == 1
+
+    breaker.abandon(future)
+    release.set()
+    future.result()
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.stats["timeouts"] == 1 and breaker.stats["failures"] == 0
+    assert breaker.state == CLOSED
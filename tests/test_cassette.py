@@ -0,0 +1,52 @@
+import threading
+import time
+
+from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_core.outputs import Generation
+
+from cassette import Cassette, CassetteLLMCache, install_search_hook
+
+LLM_STRING = '{"kwargs": {"model_name": "gpt-3.5-turbo"}}---'
+
+
+def recorded(cassette, kind):
+    return cassette._db.execute("SELECT key, latency_ms FROM calls WHERE kind = ?", (kind,)).fetchall()
+
+
+def test_failed_search_is_not_recorded(tmp_path, monkeypatch):
+    outcomes = [("ConnectionError('tavily down')", {}), ([{"url": "https://example.com", "content": "ok"}], {"results": []})]
+    monkeypatch.setenv("TAVILY_API_KEY", "test")
+    monkeypatch.setattr(TavilySearchResults, "_run", lambda self, query, run_manager=None: outcomes.pop(0))
+    cassette = Cassette(str(tmp_path / "cassette.db"), "record")
+    install_search_hook(cassette)
+    tool = TavilySearchResults(max_results=5)
+
+    assert isinstance(tool._run("godrej news")[0], str)
+    assert recorded(cassette, "search") == []
+    assert tool._run("godrej news")[0][0]["content"] == "ok"
+    assert len(recorded(cassette, "search")) == 1
+
+
+def test_concurrent_identical_prompts_keep_their_own_start(tmp_path):
+    cassette = Cassette(str(tmp_path / "cassette.db"), "record")
+    cache = CassetteLLMCache(cassette)
+    first_started = threading.Event()
+    second_started = threading.Event()
+
+    def first():
+        cache.lookup("same prompt", LLM_STRING)
+        first_started.set()
+        second_started.wait()
+        cache.update("same prompt", LLM_STRING, [Generation(text="answer")])
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    first_started.wait()
+    time.sleep(0.2)
+    # A second call with the same prompt starts while the first is still running
+    cache.lookup("same prompt", LLM_STRING)
+    second_started.set()
+    thread.join()
+
+    [(_, latency_ms)] = recorded(cassette, "llm")
+    assert latency_ms >= 200
@@ -0,0 +1,52 @@
+import threading
+import time
+
+import pytest
+
+import news
+from news import NewsService
+
+USER = {"interests": ["Consumer demand"], "skills": ["Ads"]}
+
+
+def test_concurrent_misses_share_one_build(monkeypatch):
+    searches = []
+
+    def fetch_results(self, interests, skills, current_date):
+        searches.append(interests)
+        time.sleep(0.2)
+        return [{"url": "https://www.reuters.com/a", "content": "story"}]
+
+    monkeypatch.setattr(NewsService, "fetch_results", fetch_results)
+    monkeypatch.setattr(news, "rank_articles", lambda results, *args: [{"title": "story"}])
+    service = NewsService()
+    answers = []
+    threads = [threading.Thread(target=lambda: answers.append(service.get_news(USER, 5))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(searches) == 1
+    assert answers == [[{"title": "story"}]] * 4
+    assert service.get_news(USER, 5) == [{"title": "story"}]
+    assert len(searches) == 1
+
+
+def test_failed_build_is_not_shared_with_later_calls(monkeypatch):
+    calls = []
+
+    def fetch_results(self, interests, skills, current_date):
+        calls.append(interests)
+        if len(calls) == 1:
+            raise RuntimeError("search down")
+        return []
+
+    monkeypatch.setattr(NewsService, "fetch_results", fetch_results)
+    monkeypatch.setattr(news, "rank_articles", lambda results, *args: [{"title": "story"}])
+    service = NewsService()
+
+    with pytest.raises(RuntimeError):
+        service.get_news(USER, 5)
+    assert service.get_news(USER, 5) == [{"title": "story"}]
+    assert len(calls) == 2
@@ -0,0 +1,66 @@
+import json
+
+from news_schema import parse_articles, parse_date
+
+ARTICLE = {
+    "title": "Godrej opens a new plant",
+    "summary": "The plant doubles capacity.",
+    "url": "https://www.reuters.com/business/2024/05/01/godrej-plant/",
+    "date": "2024-05-01 09:30:00 UTC",
+    "source": "reuters.com",
+}
+OTHER = dict(ARTICLE, title="Second story", url="https://apnews.com/article/second")
+
+
+def titles(articles):
+    return [article["title"] for article in articles]
+
+
+def test_wrapped_object_and_bare_list():
+    assert titles(parse_articles(json.dumps({"articles": [ARTICLE, OTHER]}))) == [ARTICLE["title"], OTHER["title"]]
+    assert titles(parse_articles(json.dumps([ARTICLE]))) == [ARTICLE["title"]]
+
+
+def test_code_fence_and_python_literal():
+    fenced = "```json\n" + json.dumps([ARTICLE]) + "\n```"
+    assert titles(parse_articles(fenced)) == [ARTICLE["title"]]
+    assert titles(parse_articles(repr([ARTICLE]))) == [ARTICLE["title"]]
+
+
+def test_truncated_output_keeps_complete_items():
+    text = json.dumps({"articles": [ARTICLE, OTHER]})
+    truncated = text[:text.index("Second story") + 5]
+    assert titles(parse_articles(truncated)) == [ARTICLE["title"]]
+
+
+def test_unbuildable_literal_falls_back_to_salvage():
+    # literal_eval raises TypeError on an unhashable dict key
+    text = "[" + json.dumps(ARTICLE) + ", {[1]: 2}]"
+    assert titles(parse_articles(text)) == [ARTICLE["title"]]
+    assert parse_articles("{[1]: 2}") == []
+
+
+def test_invalid_items_are_dropped_and_defaults_filled():
+    items = [
+        {"title": "", "url": "https://example.com"},
+        {"title": "No url"},
+        "not an article",
+        {"title": "Minimal", "url": "https://www.bbc.com/news/1"},
+    ]
+    articles = parse_articles(json.dumps(items))
+    assert titles(articles) == ["Minimal"]
+    assert articles[0]["date"] == "Recent"
+    assert articles[0]["source"] == "www.bbc.com"
+
+
+def test_garbage_returns_nothing():
+    assert parse_articles("") == []
+    assert parse_articles("Sorry, I could not find any news.") == []
+
+
+def test_parse_date_formats():
+    assert parse_date("2024-05-01 09:30:00 UTC").day == 1
+    assert parse_date("2024-05-01T09:30:00Z").hour == 9
+    assert parse_date("Published on 2024-05-01 by staff").month == 5
+    assert parse_date("Recent") is None
+    assert parse_date("2024-13-45") is None
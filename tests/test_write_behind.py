@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+import write_behind
+from write_behind import WriteBehindQueue, WriteJournal, merge_records
+
+
+class Rejected(Exception):
+    # Shaped like firebase_admin's errors: a permanent code and no HTTP status
+    code = "PERMISSION_DENIED"
+
+
+class Unavailable(Exception):
+    code = "UNAVAILABLE"
+
+
+class FakeDatabase:
+    def __init__(self, denied=(), failures=0):
+        self.denied = set(denied)
+        self.failures = failures
+        self.updates = []
+
+    def apply(self, updates):
+        if self.failures:
+            self.failures -= 1
+            raise Unavailable("try again")
+        if self.denied & set(updates):
+            raise Rejected("permission denied")
+        self.updates.append(dict(updates))
+
+
+@pytest.fixture(autouse=True)
+def dead_letter_path(tmp_path, monkeypatch):
+    path = tmp_path / "dead_letter.jsonl"
+    monkeypatch.setattr(write_behind, "WRITE_DEAD_LETTER", str(path))
+    monkeypatch.setattr(write_behind.time, "sleep", lambda seconds: None)
+    return path
+
+
+def written_paths(database):
+    return {path for updates in database.updates for path in updates}
+
+
+def run_queue(database, journal, writes):
+    # A long linger puts every write in one batch
+    write_queue = WriteBehindQueue(database.apply, journal, linger=0.3)
+    for path, value in writes:
+        write_queue.enqueue(path, value)
+    assert write_queue.flush(5)
+    write_queue.close()
+    return write_queue
+
+
+def test_merge_records_sums_increments_and_keeps_last_write():
+    updates = merge_records([
+        {"id": "1", "path": "a", "value": 1},
+        {"id": "2", "path": "a", "value": 2},
+        {"id": "3", "path": "n", "value": {".sv": {"increment": 2}}},
+        {"id": "4", "path": "n", "value": {".sv": {"increment": 2}}},
+    ])
+    assert updates == {"a": 2, "n": {".sv": {"increment": 4}}}
+
+
+def test_journal_pending_skips_acked_and_torn_lines(tmp_path):
+    journal = WriteJournal(str(tmp_path / "journal.jsonl"))
+    journal.record("1", "a", 1)
+    journal.record("2", "b", 2)
+    journal.ack(["1"])
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"id": "3", "pa')
+
+    assert [record["id"] for record in journal.pending()] == ["2"]
+
+
+def test_unacked_writes_are_replayed_on_start_and_journal_compacted(tmp_path):
+    journal = WriteJournal(str(tmp_path / "journal.jsonl"))
+    journal.record("1", "users/u1/a", 1)
+    journal.record("2", "users/u2/b", 2)
+    journal.ack(["1"])
+
+    database = FakeDatabase()
+    run_queue(database, journal, [])
+
+    assert written_paths(database) == {"users/u2/b"}
+    assert journal.pending() == []
+    with open(journal.path, encoding="utf-8") as f:
+        assert f.read() == ""
+
+
+def test_rejected_path_is_dead_lettered_without_its_batch(tmp_path, dead_letter_path):
+    journal = WriteJournal(str(tmp_path / "journal.jsonl"))
+    database = FakeDatabase(denied={"users/u2/denied"})
+    write_queue = run_queue(database, journal, [("users/u1/a", 1), ("users/u2/denied", 2), ("users/u3/c", 3)])
+
+    assert written_paths(database) == {"users/u1/a", "users/u3/c"}
+    assert write_queue.stats["written"] == 2
+    assert write_queue.stats["dead_lettered"] == 1
+    with open(dead_letter_path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert [record["path"] for entry in entries for record in entry["records"]] == ["users/u2/denied"]
+    assert "Rejected" in entries[0]["error"]
+    assert journal.pending() == []
+
+
+def test_transient_errors_are_retried(tmp_path, dead_letter_path):
+    database = FakeDatabase(failures=2)
+    write_queue = run_queue(database, WriteJournal(str(tmp_path / "journal.jsonl")), [("a", 1), ("b", 2)])
+
+    assert written_paths(database) == {"a", "b"}
+    assert write_queue.stats["retries"] == 2
+    assert write_queue.stats["dead_lettered"] == 0
+    assert not dead_letter_path.exists()
+
+
+def test_transient_errors_give_up_after_max_attempts(tmp_path, dead_letter_path, monkeypatch):
+    monkeypatch.setattr(write_behind, "WRITE_MAX_ATTEMPTS", 3)
+    database = FakeDatabase(failures=100)
+    journal = WriteJournal(str(tmp_path / "journal.jsonl"))
+    write_queue = run_queue(database, journal, [("a", 1), ("b", 2)])
+
+    assert database.updates == []
+    assert write_queue.stats["retries"] == 2
+    assert write_queue.stats["dead_lettered"] == 2
+    assert journal.pending() == []
+    with open(dead_letter_path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
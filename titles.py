@@ -0,0 +1,122 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from governor import lane
+from metrics import span, submit
+from resources import get_llm
+
+# "llm" asks the model for a short title, "heuristic" builds one locally with no LLM call
+TITLE_MODE = os.getenv("TITLE_MODE", "llm")
+TITLE_STORE_SIZE = int(os.getenv("TITLE_STORE_SIZE", "10000"))
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "to", "of", "in", "on", "for",
+    "and", "or", "with", "about", "what", "which", "who", "how", "why", "when", "where",
+    "can", "could", "would", "should", "do", "does", "did", "me", "my", "i", "you",
+    "please", "tell", "give", "show", "find", "search", "latest", "any", "some", "there",
+}
+
+
+def first_message_hash(content):
+    return hashlib.sha1(content.strip().encode("utf-8")).hexdigest()
+
+
+class TitleStore:
+    def __init__(self, max_size=TITLE_STORE_SIZE):
+        self.max_size = max_size
+        self._titles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conv_id, first_message):
+        key = (conv_id, first_message_hash(first_message))
+        with self._lock:
+            title = self._titles.get(key)
+            if title is not None:
+                self._titles.move_to_end(key)
+            return title
+
+    def set(self, conv_id, first_message, title):
+        key = (conv_id, first_message_hash(first_message))
+        with self._lock:
+            self._titles[key] = title
+            self._titles.move_to_end(key)
+            while len(self._titles) > self.max_size:
+                self._titles.popitem(last=False)
+
+
+@st.cache_resource(show_spinner=False)
+def get_title_store():
+    return TitleStore()
+
+
+@st.cache_resource(show_spinner=False)
+def get_title_executor():
+    return ThreadPoolExecutor(max_workers=int(os.getenv("TITLE_WORKERS", "4")), thread_name_prefix="title")
+
+
+def heuristic_title(text, max_words=5):
+    words = re.findall(r"[A-Za-z0-9][A-Za-z0-9&'+.-]*", text)
+    keywords = [w for w in words if w.lower() not in STOPWORDS] or words
+    if not keywords:
+        return "New Conversation"
+    title = " ".join(keywords[:max_words]).rstrip(".")
+    return title[:1].upper() + title[1:]
+
+
+# Function to summarize conversation
+def summarize_conversation(messages):
+    if not messages:
+        return "New Conversation"
+
+    first_message = messages[0]["content"]
+    summary_prompt = f"Summarize the following message in 5 words or less: {first_message}"
+
+    summary = get_llm().predict(summary_prompt)
+    return summary.strip()
+
+
+def conversation_title(conv_id, messages, mode=None):
+    if not messages:
+        return "New Conversation"
+
+    first_message = messages[0]["content"]
+    store = get_title_store()
+    title = store.get(conv_id, first_message)
+    if title:
+        return title
+
+    with span("title", mode=mode or TITLE_MODE), lane("title"):
+        if (mode or TITLE_MODE) == "heuristic":
+            title = heuristic_title(first_message)
+        else:
+            title = summarize_conversation(messages)
+    store.set(conv_id, first_message, title)
+    return title
+
+
+def start_conversation_title(conv_id, messages, on_title):
+    # The title lane is the lowest priority, so the chat turn never waits on it: the stored or
+    # heuristic title is returned now and the model's title goes to on_title when it is ready
+    if not messages or TITLE_MODE == "heuristic":
+        return conversation_title(conv_id, messages)
+    first_message = messages[0]["content"]
+    title = get_title_store().get(conv_id, first_message)
+    if title:
+        return title
+
+    def run():
+        try:
+            title = conversation_title(conv_id, messages[:1])
+        except Exception:
+            # RateLimited after GOVERNOR_MAX_WAIT, or the call failed; the placeholder stays
+            return
+        on_title(title)
+
+    submit(get_title_executor(), run)
+    return heuristic_title(first_message)
@@ -0,0 +1,12 @@
+try:
+    import tiktoken
+    _encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # Rough fallback, about four characters per token for English text
+    return len(text) // 4 + 1
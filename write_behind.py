@@ -0,0 +1,237 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from metrics import span
+
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "100"))
+WRITE_LINGER = float(os.getenv("WRITE_LINGER", "0.05"))
+WRITE_MAX_BACKOFF = float(os.getenv("WRITE_MAX_BACKOFF", "30"))
+WRITE_JOURNAL = os.getenv("WRITE_JOURNAL", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".write_journal.jsonl"))
+# Batches that fail permanently, or WRITE_MAX_ATTEMPTS times, are set aside here so later writes
+# are not stuck behind them; an empty path only logs them
+WRITE_MAX_ATTEMPTS = int(os.getenv("WRITE_MAX_ATTEMPTS", "8"))
+WRITE_DEAD_LETTER = os.getenv("WRITE_DEAD_LETTER", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".write_dead_letter.jsonl"))
+# Firebase error codes worth retrying; anything else (auth, permissions, invalid or oversized payloads) is not
+RETRYABLE_CODES = {"UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED", "ABORTED", "UNKNOWN"}
+
+logger = logging.getLogger("chat.write_behind")
+
+
+def unique_key(now=None):
+    # Microseconds plus a random suffix, so two writes in the same second never share a key
+    now = now or datetime.now()
+    return f"{now.strftime('%Y-%m-%dT%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+
+
+def is_increment(value):
+    return isinstance(value, dict) and isinstance(value.get(".sv"), dict) and "increment" in value[".sv"]
+
+
+def is_retryable(error):
+    # Transport errors and 408/429/5xx are retried; other 4xx and Firebase's permanent codes are not.
+    # Errors that carry neither a status nor a code are treated as transport errors.
+    response = getattr(error, "http_response", None) or getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    code = getattr(error, "code", None)
+    if isinstance(code, str):
+        return code in RETRYABLE_CODES
+    return not isinstance(error, (ValueError, TypeError))
+
+
+def merge_records(records):
+    # Later writes to the same path win, matching the order they were made in,
+    # except server-side increments which are summed so none is lost
+    updates = {}
+    for record in records:
+        path, value = record["path"], record["value"]
+        if is_increment(value) and is_increment(updates.get(path)):
+            value = {".sv": {"increment": updates[path][".sv"]["increment"] + value[".sv"]["increment"]}}
+        updates[path] = value
+    return updates
+
+
+def dead_letter(records, error, path=None):
+    path = WRITE_DEAD_LETTER if path is None else path
+    logger.error("dropping %d queued writes after %r", len(records), error)
+    if path:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"at": time.time(), "error": repr(error), "records": records}) + "\n")
+
+
+class WriteJournal:
+    def __init__(self, path=WRITE_JOURNAL):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _append(self, record):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record(self, write_id, path, value):
+        self._append({"id": write_id, "path": path, "value": value})
+
+    def ack(self, write_ids):
+        self._append({"ack": write_ids})
+
+    def pending(self):
+        if not os.path.exists(self.path):
+            return []
+        writes, acked = {}, set()
+        with self._lock, open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    continue
+                if "ack" in record:
+                    acked.update(record["ack"])
+                else:
+                    writes[record["id"]] = record
+        return [record for write_id, record in writes.items() if write_id not in acked]
+
+    def compact(self, pending_records):
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in pending_records:
+                    f.write(json.dumps(record) + "\n")
+            os.replace(tmp_path, self.path)
+
+
+class WriteBehindQueue:
+    def __init__(self, apply_updates, journal=None, batch_size=WRITE_BATCH_SIZE, linger=WRITE_LINGER):
+        # apply_updates receives a {path: value} dict and writes it as one multi-path update
+        self.apply_updates = apply_updates
+        self.journal = journal
+        self.batch_size = batch_size
+        self.linger = linger
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "retries": 0, "dead_lettered": 0}
+
+        if self.journal is not None:
+            replay = self.journal.pending()
+            self.journal.compact(replay)
+            for record in replay:
+                self._put(record["id"], record["path"], record["value"])
+
+        self._worker = threading.Thread(target=self._run, daemon=True, name="write-behind")
+        self._worker.start()
+
+    def _put(self, write_id, path, value, journal=False):
+        # The journal record and the in-flight entry change together so compaction never drops a live write
+        with self._lock:
+            if journal and self.journal is not None:
+                self.journal.record(write_id, path, value)
+            self._inflight[write_id] = {"id": write_id, "path": path, "value": value}
+            self.stats["enqueued"] += 1
+        self._queue.put(write_id)
+
+    def enqueue(self, path, value):
+        write_id = uuid.uuid4().hex
+        self._put(write_id, path, value, journal=True)
+        return write_id
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _apply(self, records, written, failed):
+        # Returns False when shutdown interrupts the retries; records not yet in written or
+        # failed stay in the journal and are replayed on the next start
+        updates = merge_records(records)
+        attempt = 0
+        while True:
+            try:
+                with span("firebase.write", paths=len(updates), attempt=attempt):
+                    self.apply_updates(updates)
+                written.extend(records)
+                return True
+            except Exception as e:
+                if not is_retryable(e) and len(records) > 1:
+                    # One rejected path fails the whole multi-path update; halve the batch
+                    # until the records Firebase refuses are isolated
+                    middle = len(records) // 2
+                    return self._apply(records[:middle], written, failed) and self._apply(records[middle:], written, failed)
+                if not is_retryable(e) or attempt + 1 >= WRITE_MAX_ATTEMPTS:
+                    dead_letter(records, e)
+                    failed.extend(records)
+                    return True
+                if self._stop.is_set() and attempt >= 2:
+                    return False
+                attempt += 1
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(min(WRITE_MAX_BACKOFF, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+    def _write(self, batch):
+        with self._lock:
+            records = [self._inflight[write_id] for write_id in batch]
+        written, failed = [], []
+        finished = self._apply(records, written, failed)
+
+        done = [record["id"] for record in written + failed]
+        with self._lock:
+            for write_id in done:
+                self._inflight.pop(write_id, None)
+            self.stats["written"] += len(written)
+            self.stats["dead_lettered"] += len(failed)
+            if written:
+                self.stats["batches"] += 1
+            if self.journal is not None and done:
+                if self._inflight:
+                    self.journal.ack(done)
+                else:
+                    self.journal.compact([])
+        return finished
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch and not self._write(batch):
+                return
+
+    def pending(self):
+        with self._lock:
+            return len(self._inflight)
+
+    def flush(self, timeout=10):
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.pending() == 0
+
+    def close(self, timeout=10):
+        self._stop.set()
+        self._worker.join(timeout)
+
+
+def start_write_queue(apply_updates, journal_path=WRITE_JOURNAL):
+    journal = WriteJournal(journal_path) if journal_path else None
+    write_queue = WriteBehindQueue(apply_updates, journal)
+    atexit.register(write_queue.close)
+    return write_queue